@@ -0,0 +1,131 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import hw2
+
+# benchmarks are run from the hw2 directory, since get_parameter_vectors opens e.txt and s.txt relative to it
+SAMPLES = 'samples'
+
+# list the sample letters, ignoring the expected outputs
+def sample_files(repeat=1):
+    files = [os.path.join(SAMPLES, name) for name in sorted(os.listdir(SAMPLES)) if not name.endswith('_out.txt')]
+    return files * repeat
+
+# time a function, returning the best of a few runs
+def best_time(function, runs=3):
+    best = np.inf
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+# documents per second of the per-file path against classify_corpus
+def benchmark_batch(repeat=200, processes=None):
+    files = sample_files(repeat)
+    loop_time = best_time(lambda: [hw2.get_conditional_probability_simplify_english(f) for f in files])
+    serial_time = best_time(lambda: hw2.classify_corpus(files, processes=1))
+    pool_time = best_time(lambda: hw2.classify_corpus(files, processes=processes or os.cpu_count() or 1))
+    default_time = best_time(lambda: hw2.classify_corpus(files))
+
+    # the batch path must agree with the per-file path
+    _, _, probability = hw2.classify_corpus(files, processes=1)
+    expected = np.array([hw2.get_conditional_probability_simplify_english(f) for f in sample_files()])
+    assert np.allclose(probability[:len(expected)], expected)
+
+    print('batch classification of {} documents'.format(len(files)))
+    print('{:<24}{:>12.0f} docs/s'.format('per-file get_F', len(files) / loop_time))
+    print('{:<24}{:>12.0f} docs/s'.format('classify_corpus serial', len(files) / serial_time))
+    print('{:<24}{:>12.0f} docs/s'.format('classify_corpus pool', len(files) / pool_time))
+    print('{:<24}{:>12.0f} docs/s'.format('classify_corpus default', len(files) / default_time))
+
+# write a generated file of about size_mb megabytes made of the sample letters, returns its filename
+def generate_corpus(size_mb, name):
+    text = ''.join(open(f, encoding='utf-8').read() for f in sample_files()).encode('utf-8')
+    filename = os.path.join(tempfile.gettempdir(), name)
+    with open(filename, 'wb') as f:
+        for _ in range(size_mb * (1 << 20) // len(text) + 1):
+            f.write(text)
+    return filename
+
+# scaling efficiency of shred_sharded from 1 to max_processes cores on a generated file of about size_mb megabytes
+def benchmark_sharded(size_mb=256, max_processes=None):
+    max_processes = max_processes or os.cpu_count() or 1
+    filename = generate_corpus(size_mb, 'hw2_sharded_benchmark.txt')
+    try:
+        expected = hw2.shred_fast(filename)
+        print('sharded counting of {:.0f} MB'.format(os.path.getsize(filename) / (1 << 20)))
+        print('{:>10}{:>12}{:>12}{:>12}'.format('processes', 'seconds', 'speedup', 'efficiency'))
+        single_time = None
+        # powers of two up to max_processes, and max_processes itself
+        steps = sorted(set([2 ** i for i in range(max_processes.bit_length()) if 2 ** i <= max_processes] + [max_processes]))
+        for processes in steps:
+            assert hw2.shred_sharded(filename, processes) == expected
+            elapsed = best_time(lambda: hw2.shred_sharded(filename, processes))
+            single_time = single_time or elapsed
+            print('{:>10}{:>12.3f}{:>12.2f}{:>12.2f}'.format(processes, elapsed, single_time / elapsed, single_time / elapsed / processes))
+    finally:
+        os.remove(filename)
+
+# sample letters with a known language, letter1 is punctuation and letter4 is German
+LABELED_SAMPLES = {'English': ['letter0.txt', 'letter2.txt'], 'Spanish': ['letter3.txt']}
+
+# labeled non-empty lines of the sample letters, as (language, bytes) pairs
+def labeled_lines():
+    lines = []
+    for name in LABELED_SAMPLES:
+        for sample in LABELED_SAMPLES[name]:
+            with open(os.path.join(SAMPLES, sample), 'rb') as f:
+                lines += [(name, line) for line in f.read().splitlines() if line.strip()]
+    return lines
+
+# accuracy of the shipped e.txt/s.txt model on the labeled sample lines, nothing is held out since it is not trained on them
+def unigram_accuracy():
+    model = hw2.get_language_model()
+    lines = labeled_lines()
+    return np.mean([model.classify(hw2.count_bytes(line)) == name for name, line in lines])
+
+# leave-one-line-out accuracy of an n-gram model trained on the labeled sample lines
+# every line is a short text and the training set is small, which is where a retrained unigram model struggles
+def ngram_accuracy(n, alpha=1.0):
+    lines = labeled_lines()
+    names = list(LABELED_SAMPLES)
+    counts = np.array([np.bincount(hw2.ngram_indices(hw2.letter_codes(line), n), minlength=26 ** n) for _, line in lines])
+    totals = np.array([counts[[i for i in range(len(lines)) if lines[i][0] == name]].sum(axis=0) for name in names]).T
+    correct = 0
+    for i in range(len(lines)):
+        # remove the held-out line from the training counts of its language
+        held_out = totals.copy()
+        held_out[:, names.index(lines[i][0])] -= counts[i]
+        model = hw2.NgramLanguageModel.from_counts(names, held_out, n, alpha)
+        correct += model.classify(counts[i]) == lines[i][0]
+    return correct / len(lines)
+
+# throughput and accuracy of the unigram path against the bigram and trigram models
+# the unigram row is the shipped e.txt/s.txt model, the retrained row is a unigram NgramLanguageModel scored like the n-grams
+def benchmark_ngram(size_mb=32):
+    filename = generate_corpus(size_mb, 'hw2_ngram_benchmark.txt')
+    try:
+        unigram = hw2.get_language_model()
+        unigram_time = best_time(lambda: unigram.log_joint(hw2.shred_counts(filename)))
+        print('n-gram language identification, throughput on {:.0f} MB and accuracy on the lines of {} (leave-one-line-out for the trained models)'.format(os.path.getsize(filename) / (1 << 20), SAMPLES))
+        print('{:<22}{:>10}{:>10}'.format('model', 'MB/s', 'accuracy'))
+        print('{:<22}{:>10.1f}{:>10.2f}'.format('unigram', size_mb / unigram_time, unigram_accuracy()))
+        print('{:<22}{:>10}{:>10.2f}'.format('unigram (retrained)', '', ngram_accuracy(1)))
+        for n in [2, 3]:
+            model = hw2.NgramLanguageModel.from_counts(list(LABELED_SAMPLES), np.ones((26 ** n, len(LABELED_SAMPLES))), n)
+            ngram_time = best_time(lambda: model.log_joint(model.count(filename)))
+            print('{:<22}{:>10.1f}{:>10.2f}'.format('{}-gram'.format(n), size_mb / ngram_time, ngram_accuracy(n)))
+    finally:
+        os.remove(filename)
+
+def main():
+    benchmarks = {'batch': benchmark_batch, 'sharded': benchmark_sharded, 'ngram': benchmark_ngram}
+    names = sys.argv[1:] or list(benchmarks)
+    for name in names:
+        benchmarks[name]()
+
+if __name__ == '__main__':
+    main()
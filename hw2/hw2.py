@@ -1,21 +1,22 @@
+import os
 import sys
+import csv
+import json
 import math
+import mmap
+import socket
+import struct
+import functools
+import multiprocessing
 import numpy as np
 
-def get_parameter_vectors():
-    '''
-    This function parses e.txt and s.txt to get the  26-dimensional multinomial
-    parameter vector (characters probabilities of English and Spanish) as
-    descibed in section 1.2 of the writeup
-
-    Returns: tuple of vectors e and s
-    '''
-    #Implementing vectors e,s as lists (arrays) of length 26
+# parse a parameter file such as e.txt into a 26-dimensional list of character probabilities
+def read_parameter_file(filename):
+    #Implementing the vector as a list (array) of length 26
     #with p[0] being the probability of 'A' and so on
-    e=[0]*26
-    s=[0]*26
+    p=[0]*26
 
-    with open('e.txt',encoding='utf-8') as f:
+    with open(filename,encoding='utf-8') as f:
         for line in f:
             #strip: removes the newline character
             #split: split the string on space character
@@ -23,14 +24,22 @@ def get_parameter_vectors():
             #ord('E') gives the ASCII (integer) value of character 'E'
             #we then subtract it from 'A' to give array index
             #This way 'A' gets index 0 and 'Z' gets index 25.
-            e[ord(char)-ord('A')]=float(prob)
-    f.close()
+            p[ord(char)-ord('A')]=float(prob)
 
-    with open('s.txt',encoding='utf-8') as f:
-        for line in f:
-            char,prob=line.strip().split(" ")
-            s[ord(char)-ord('A')]=float(prob)
-    f.close()
+    return p
+
+def get_parameter_vectors():
+    '''
+    This function parses e.txt and s.txt to get the  26-dimensional multinomial
+    parameter vector (characters probabilities of English and Spanish) as
+    descibed in section 1.2 of the writeup. The files are only parsed the first
+    time, later calls reuse the cached LanguageModel
+
+    Returns: tuple of vectors e and s
+    '''
+    model = get_language_model()
+    e = model.parameters[:, 0].tolist()
+    s = model.parameters[:, 1].tolist()
 
     return (e,s)
 
@@ -53,6 +62,239 @@ def shred(filename):
     # return X
     return X
 
+# translation table from a UTF-8 byte to its letter bucket, 0-25 for 'A' to 'Z' and 26 for everything else
+# bytes >= 0x80 never encode an ASCII letter in UTF-8, so they all go to the ignored bucket
+SHRED_TABLE = np.full(256, 26, dtype=np.uint8)
+for i in range(26):
+    SHRED_TABLE[ord('A') + i] = i
+    SHRED_TABLE[ord('a') + i] = i
+# the only non-ASCII characters whose upper() is an ASCII letter, they are counted by shred as well
+# accented letters such as 'á' or 'ñ' upper() to 'Á' and 'Ñ' and are therefore ignored, same as shred
+SHRED_EXTRA = [(b'\xc4\xb1', ord('I') - ord('A')), # 'ı' dotless i
+               (b'\xc5\xbf', ord('S') - ord('A'))] # 'ſ' long s
+
+# count the letters of a chunk of UTF-8 bytes into a 26-dimensional count vector
+# prev is the last byte of the previous chunk, so that two-byte characters split across chunks are still counted
+def count_bytes(buffer, prev=0):
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    counts = np.bincount(SHRED_TABLE[data], minlength=27)[:26]
+    if len(data) > 0:
+        # prepend the previous byte to match the two-byte sequences
+        pairs = np.concatenate(([prev], data)).astype(np.uint8)
+        for (lead, trail), index in SHRED_EXTRA:
+            counts[index] += np.count_nonzero((pairs[:-1] == lead) & (pairs[1:] == trail))
+    return counts
+
+# convert a 26-dimensional count vector to the same dictionary as shred
+def counts_to_dict(counts):
+    return {chr(i + ord("A")) : int(counts[i]) for i in range(26)}
+
+# count the letters of a file into a 26-dimensional count vector, reading it in binary chunks
+# memory use is bounded by chunk_size no matter how big the file is
+def shred_counts(filename, chunk_size=1 << 24):
+    counts = np.zeros(26, dtype=np.int64)
+    prev = 0
+    with open(filename, 'rb') as f:
+        while True:
+            buffer = f.read(chunk_size)
+            if not buffer:
+                break
+            counts += count_bytes(buffer, prev)
+            prev = buffer[-1]
+    return counts
+
+# move a byte offset forward to the start of a UTF-8 character, skipping continuation bytes 10xxxxxx
+def align_to_character(data, offset):
+    while offset < len(data) and data[offset] & 0xC0 == 0x80:
+        offset += 1
+    return offset
+
+# split a memory-mapped file into at most shards byte ranges, every range starts on a character boundary
+def get_shard_ranges(data, shards):
+    size = len(data)
+    boundaries = [0] + [align_to_character(data, size * i // shards) for i in range(1, shards)] + [size]
+    return [(boundaries[i], boundaries[i + 1]) for i in range(shards) if boundaries[i] < boundaries[i + 1]]
+
+# count the letters of the byte range [start, end) of a file, run in a worker process
+def count_shard(filename, start, end, chunk_size=1 << 24):
+    counts = np.zeros(26, dtype=np.int64)
+    prev = 0
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        view = memoryview(data)
+        try:
+            for offset in range(start, end, chunk_size):
+                buffer = view[offset:min(offset + chunk_size, end)]
+                counts += count_bytes(buffer, prev)
+                prev = buffer[-1]
+                buffer.release()
+        finally:
+            view.release()
+    return counts
+
+# count a single huge file on several cores, the file is memory-mapped and split into character-aligned shards
+# the 26-count vectors of the shards are summed, which gives exactly the counts of shred
+def shred_sharded(filename, processes=None, chunk_size=1 << 24):
+    processes = processes or os.cpu_count() or 1
+    if os.path.getsize(filename) == 0:
+        return counts_to_dict(np.zeros(26, dtype=np.int64))
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        ranges = get_shard_ranges(data, processes)
+    if processes == 1:
+        counts = count_shard(filename, *ranges[0], chunk_size=chunk_size)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            counts = sum(pool.starmap(count_shard, [(filename, start, end, chunk_size) for start, end in ranges]))
+    return counts_to_dict(counts)
+
+# same result as shred, but counts the file with shred_counts
+def shred_fast(filename, chunk_size=1 << 24):
+    return counts_to_dict(shred_counts(filename, chunk_size))
+
+# convert a dictionary returned by shred to a 26-dimensional count vector, ordered from A to Z
+def dict_to_counts(dict):
+    X = np.zeros(26, dtype=np.int64)
+    for item in dict:
+        X[ord(item)-ord('A')] = dict[item]
+    return X
+
+# numerically stable log(sum(exp(F))) along the last axis
+def logsumexp(F):
+    F_max = np.max(F, axis=-1, keepdims=True)
+    # avoid nan when every entry is -inf
+    F_max[~np.isfinite(F_max)] = 0
+    return np.log(np.sum(np.exp(F - F_max), axis=-1)) + F_max[..., 0]
+
+class LanguageModel:
+    """ Multinomial character model of any number of languages, loaded once.
+
+    The parameter files are parsed when the model is built, and the log-probabilities
+    and log-priors are precomputed, so scoring a document is one matrix product.
+    """
+    # length of the character n-grams the parameters are over, single letters here
+    n = 1
+
+    def __init__(self, parameter_files, priors=None):
+        """ Loads the parameter files.
+
+        Args:
+            parameter_files (dict): language name to parameter file in the e.txt format
+            priors (list of float): prior probability of each language, uniform if None
+        """
+        self.names = list(parameter_files)
+        # 26 x K matrix, column k holds the character probabilities of language k
+        self.set_parameters(np.array([read_parameter_file(parameter_files[name]) for name in self.names], dtype=np.float64).T, priors)
+
+    def set_parameters(self, parameters, priors=None):
+        """ Sets the 26 x K parameter matrix and the priors, and precomputes their logs.
+        """
+        self.parameters = np.asarray(parameters, dtype=np.float64)
+        if priors is None:
+            priors = [1 / len(self.names)] * len(self.names)
+        self.priors = np.array(priors, dtype=np.float64)
+        if self.priors.shape != (len(self.names),):
+            raise ValueError('expected {} priors, one per language, got shape {}'.format(len(self.names), self.priors.shape))
+        self.log_parameters = np.log(self.parameters)
+        self.log_priors = np.log(self.priors)
+
+    @classmethod
+    def from_parameters(cls, names, parameters, priors=None):
+        """ Builds a model from a 26 x K parameter matrix instead of parameter files.
+        """
+        model = cls.__new__(cls)
+        model.names = list(names)
+        model.set_parameters(parameters, priors)
+        return model
+
+    @classmethod
+    def load(cls, filename):
+        """ Loads a binary model written by save, without parsing any text.
+        """
+        with open(filename, 'rb') as f:
+            data = f.read()
+        if not data.startswith(MODEL_MAGIC):
+            raise ValueError('{} is not a language model file'.format(filename))
+        # the magic is followed by the header length, the JSON header and the K x (1 + 26^n) float64 matrix of priors and parameters
+        offset = len(MODEL_MAGIC) + 4
+        header_length, = struct.unpack('<I', data[len(MODEL_MAGIC):offset])
+        header = json.loads(data[offset:offset + header_length])
+        # files written before n was stored in the header are unigram models
+        n = header.get('n', 1)
+        matrix = np.frombuffer(data, dtype='<f8', offset=offset + header_length).reshape(len(header['names']), 1 + 26 ** n)
+        if n > 1:
+            return NgramLanguageModel.from_parameters(header['names'], matrix[:, 1:].T, matrix[:, 0], n)
+        return cls.from_parameters(header['names'], matrix[:, 1:].T, matrix[:, 0])
+
+    def save(self, filename, **header):
+        """ Writes the model in a compact binary format, extra keyword arguments are stored in its header.
+        """
+        header = json.dumps(dict(header, names=self.names, n=self.n)).encode('utf-8')
+        matrix = np.column_stack([self.priors, self.parameters.T]).astype('<f8')
+        with open(filename, 'wb') as f:
+            f.write(MODEL_MAGIC + struct.pack('<I', len(header)) + header)
+            f.write(matrix.tobytes())
+
+    def export_text(self, filenames):
+        """ Writes the parameters of each language in the legacy e.txt format.
+
+        Args:
+            filenames (dict): language name to output file
+        """
+        for name in filenames:
+            column = self.parameters[:, self.names.index(name)]
+            with open(filenames[name], 'w', encoding='utf-8') as f:
+                for i in range(26):
+                    f.write('{} {}\n'.format(chr(i + ord('A')), repr(float(column[i]))))
+
+    def log_joint(self, counts):
+        """ log P(X, Y = language) up to the multinomial coefficient, the F of get_F.
+
+        Args:
+            counts: a shred dictionary, a 26 count vector or an N x 26 count matrix
+
+        Return:
+            K vector, or N x K matrix, of F values
+        """
+        if isinstance(counts, dict):
+            counts = dict_to_counts(counts)
+        return np.asarray(counts) @ self.log_parameters + self.log_priors
+
+    def posterior(self, counts):
+        """ P(Y = language | X) of every language, computed with logsumexp so it never overflows.
+        """
+        F = self.log_joint(counts)
+        return np.exp(F - logsumexp(F)[..., np.newaxis])
+
+    def classify(self, counts):
+        """ Name of the most probable language, or a list of names for a count matrix.
+        """
+        index = np.argmax(self.log_joint(counts), axis=-1)
+        if np.ndim(index) == 0:
+            return self.names[index]
+        return [self.names[i] for i in index]
+
+# identifies the binary model files written by LanguageModel.save, the last byte is the format version
+MODEL_MAGIC = b'HW2LM\x01'
+
+# estimate the 26 x K parameter matrix from labeled corpora, with additive (Laplace) smoothing alpha
+# corpora maps each language name to a list or directory of files, the files are counted in parallel
+def train_parameters(corpora, alpha=1.0, processes=None):
+    counts = np.array([count_corpus(list_corpus(corpora[name]), processes).sum(axis=0) for name in corpora], dtype=np.float64).T
+    return (counts + alpha) / (counts.sum(axis=0) + 26 * alpha)
+
+# train a LanguageModel from labeled corpora
+def train_language_model(corpora, alpha=1.0, priors=None, processes=None):
+    return LanguageModel.from_parameters(list(corpora), train_parameters(corpora, alpha, processes), priors)
+
+# models already loaded, keyed by the absolute paths of their parameter files
+language_models = {}
+
+# the English/Spanish model of the writeup, loaded from e.txt and s.txt on first use
+def get_language_model(e_file='e.txt', s_file='s.txt'):
+    key = (os.path.abspath(e_file), os.path.abspath(s_file))
+    if key not in language_models:
+        language_models[key] = LanguageModel({'English': e_file, 'Spanish': s_file}, priors=[0.6, 1 - 0.6])
+    return language_models[key]
+
 def print_counts(filename):
     # print the 26 character counts for letter.txt
     output_dict = shred(filename)
@@ -110,23 +352,33 @@ def get_conditional_probability(dict):
 
     return (conditional_probability_e, conditional_probability_s)
 
-def get_F(dict):
-    # convert dictionary to list, ordered from A to Z
-    X=[0]*26
-    for item in dict:
-        X[ord(item)-ord('A')] = dict[item]
-    # sum of all counts
-    total = sum(X)
+# log of the multinomial coefficient total! / (X_1! ... X_26!), computed with lgamma in O(26)
+def log_multinomial_coefficient(X):
+    return math.lgamma(sum(X) + 1) - sum(math.lgamma(x + 1) for x in X)
 
-    # define prior probabilities of letter being English or Spanish
-    probability_English = 0.6
-    probability_Spanish = 1 - probability_English
+# same posteriors as get_conditional_probability, but computed in log space
+# the cost is O(26) no matter how long the document is, and it never overflows or underflows
+def get_log_conditional_probability(dict):
+    # convert dictionary to a count vector, ordered from A to Z
+    X = dict_to_counts(dict)
 
-    # get multinomial parameter vectors
-    e, s = get_parameter_vectors()
+    model = get_language_model()
+    # log P(X | Y = language) for English and Spanish
+    log_likelihood = log_multinomial_coefficient(X.tolist()) + X @ model.log_parameters
+    # log P(X | Y = language) P(Y = language)
+    log_joint = log_likelihood + model.log_priors
+
+    # P(Y = language | X), normalized with logsumexp
+    conditional_probability_e, conditional_probability_s = np.exp(log_joint - logsumexp(log_joint))
+
+    return (conditional_probability_e, conditional_probability_s)
+
+def get_F(dict):
+    # convert dictionary to a count vector, ordered from A to Z
+    X = dict_to_counts(dict)
 
-    F_e = np.log(probability_English) + np.sum([X[i] * np.log(e[i]) for i in range(26)])
-    F_s = np.log(probability_Spanish) + np.sum([X[i] * np.log(s[i]) for i in range(26)])
+    # the log parameters and log priors are precomputed by the language model
+    F_e, F_s = get_language_model().log_joint(X)
 
     return (F_e, F_s)
 
@@ -151,6 +403,218 @@ def Q4(filename):
     print('Q4')
     print('{:.4f}'.format(get_conditional_probability_simplify_english(filename)))
 
+# 1.4 Batch classification
+# list the files to classify, either a list of filenames or every file in a directory
+def list_corpus(paths):
+    if isinstance(paths, str):
+        if os.path.isdir(paths):
+            return sorted(os.path.join(paths, name) for name in os.listdir(paths) if os.path.isfile(os.path.join(paths, name)))
+        return [paths]
+    return list(paths)
+
+# below this many bytes in total, starting a process pool costs more than counting the files serially
+POOL_MIN_BYTES = 1 << 23
+
+# count every file into an N x 26 count matrix, the counting is spread over a process pool
+# with processes=None the pool is only used for corpora of at least POOL_MIN_BYTES on a multi-core machine
+# counter is called on every filename and returns its count vector, shred_counts by default
+def count_corpus(filenames, processes=None, chunk_size=1 << 24, counter=shred_counts, width=26):
+    if len(filenames) == 0:
+        return np.zeros((0, width), dtype=np.int64)
+    if processes is None:
+        processes = os.cpu_count() or 1
+        if sum(os.path.getsize(filename) for filename in filenames) < POOL_MIN_BYTES:
+            processes = 1
+    if processes == 1:
+        return np.array([counter(filename, chunk_size=chunk_size) for filename in filenames], dtype=np.int64)
+    with multiprocessing.Pool(processes) as pool:
+        rows = pool.map(functools.partial(counter, chunk_size=chunk_size), filenames, chunksize=max(1, len(filenames) // (4 * processes)))
+    return np.array(rows, dtype=np.int64)
+
+# compute F_e and F_s of every row of the count matrix with one matrix product, same values as get_F
+def get_F_batch(counts, model=None):
+    if model is None:
+        model = get_language_model()
+    return model.log_joint(counts)
+
+# vectorized get_conditional_probability_simplify_english over the rows of get_F_batch
+def simplify_english_batch(F):
+    difference = F[:, 1] - F[:, 0]
+    probability = 1 / (1 + np.exp(np.clip(difference, -100, 100)))
+    probability[difference >= 100] = 0
+    probability[difference <= -100] = 1
+    return probability
+
+# write the results as CSV, or NDJSON if the output filename ends with .ndjson or .jsonl
+# F_e and F_s are the unnormalized log joints of get_F, log_P_english and log_P_spanish the normalized log-posteriors
+def write_results(output, filenames, F, probability):
+    log_posterior = F - logsumexp(F)[:, np.newaxis]
+    with open(output, 'w', encoding='utf-8', newline='') as f:
+        if output.endswith(('.ndjson', '.jsonl')):
+            for i in range(len(filenames)):
+                f.write(json.dumps({'file': filenames[i], 'F_e': float(F[i, 0]), 'F_s': float(F[i, 1]),
+                                    'log_P_english': float(log_posterior[i, 0]), 'log_P_spanish': float(log_posterior[i, 1]),
+                                    'P_english': float(probability[i])}) + '\n')
+        else:
+            writer = csv.writer(f)
+            writer.writerow(['file', 'F_e', 'F_s', 'log_P_english', 'log_P_spanish', 'P_english'])
+            for i in range(len(filenames)):
+                writer.writerow([filenames[i], repr(float(F[i, 0])), repr(float(F[i, 1])),
+                                 repr(float(log_posterior[i, 0])), repr(float(log_posterior[i, 1])), repr(float(probability[i]))])
+
+# classify a list or directory of files, returns the filenames, the N x 2 matrix of unnormalized log joints F and P(English | X)
+def classify_corpus(paths, output=None, processes=None):
+    filenames = list_corpus(paths)
+    F = get_F_batch(count_corpus(filenames, processes))
+    probability = simplify_english_batch(F)
+    if output is not None:
+        write_results(output, filenames, F, probability)
+    return filenames, F, probability
+
+# 1.5 Early-stopping streaming classification
+# P(English | X) from the log-odds F_e - F_s, same as get_conditional_probability_simplify_english
+def simplify_english_from_odds(log_odds):
+    if log_odds <= -100:
+        return 0
+    elif log_odds >= 100:
+        return 1
+    else:
+        return 1 / (1 + np.exp(-log_odds))
+
+# sequential probability ratio test over a binary stream, the English/Spanish log-odds are updated after each chunk
+# reading stops as soon as P(English | X) >= threshold or <= 1 - threshold, a threshold of 1 reads the whole stream
+# returns P(English | X) and the number of bytes consumed
+def classify_stream(stream, threshold=0.99, chunk_size=4096, model=None):
+    if not 0.5 < threshold <= 1:
+        raise ValueError('threshold must be in (0.5, 1], got {}'.format(threshold))
+    if model is None:
+        model = get_language_model()
+    # the log-odds change by X . (log e - log s) for every chunk, starting from the log-odds of the priors
+    log_ratio = model.log_parameters[:, 0] - model.log_parameters[:, 1]
+    log_odds = model.log_priors[0] - model.log_priors[1]
+    upper = np.log(threshold) - np.log(1 - threshold) if threshold < 1 else np.inf
+    # read1 returns as soon as some data is available, which matters for stdin and sockets
+    read = getattr(stream, 'read1', stream.read)
+    consumed = 0
+    prev = 0
+    while -upper < log_odds < upper:
+        buffer = read(chunk_size)
+        if not buffer:
+            break
+        consumed += len(buffer)
+        log_odds += count_bytes(buffer, prev) @ log_ratio
+        prev = buffer[-1]
+    return simplify_english_from_odds(log_odds), consumed
+
+# classify_stream on a filename, '-' for stdin, or a connected socket
+def classify_source(source, threshold=0.99, chunk_size=4096, model=None):
+    if source == '-':
+        return classify_stream(sys.stdin.buffer, threshold, chunk_size, model)
+    if isinstance(source, socket.socket):
+        with source.makefile('rb') as stream:
+            return classify_stream(stream, threshold, chunk_size, model)
+    with open(source, 'rb') as stream:
+        return classify_stream(stream, threshold, chunk_size, model)
+
+# 1.6 Character n-gram language identification
+# encode a chunk of UTF-8 bytes as letter codes, 0-25 for 'A' to 'Z' and 26 for everything else
+# the two non-ASCII letters counted by shred are rare enough that they are treated as non-letters here
+def letter_codes(buffer):
+    return SHRED_TABLE[np.frombuffer(buffer, dtype=np.uint8)]
+
+# index of every n-gram of consecutive letters, n-grams that contain a non-letter are skipped
+# the windows are views made with stride tricks, so no n x len(codes) copy is made before filtering
+def ngram_indices(codes, n):
+    if len(codes) < n:
+        return np.zeros(0, dtype=np.int64)
+    windows = np.lib.stride_tricks.sliding_window_view(codes, n)
+    valid = np.all(windows < 26, axis=1)
+    # base-26 number of the n letters, the first letter is the most significant digit
+    return windows[valid].astype(np.int64) @ (26 ** np.arange(n - 1, -1, -1, dtype=np.int64))
+
+# count the n-grams of a file into a dense 26^n vector, reading it in binary chunks
+# the last n - 1 codes of a chunk are carried over so n-grams across chunks are counted once
+def ngram_counts(filename, n=2, chunk_size=1 << 24):
+    counts = np.zeros(26 ** n, dtype=np.int64)
+    tail = np.zeros(0, dtype=np.uint8)
+    with open(filename, 'rb') as f:
+        while True:
+            buffer = f.read(chunk_size)
+            if not buffer:
+                break
+            codes = np.concatenate((tail, letter_codes(buffer)))
+            counts += np.bincount(ngram_indices(codes, n), minlength=26 ** n)
+            tail = codes[len(codes) - (n - 1):] if n > 1 else tail
+    return counts
+
+class NgramLanguageModel(LanguageModel):
+    """ Multinomial model over character n-grams, a LanguageModel with 26^n parameters per language.
+
+    Documents are counted with ngram_counts, and since most of the 26^n counts of a document
+    are zero, log_joint only sums over its nonzero n-grams.
+    """
+    def __init__(self, parameter_files, priors=None):
+        """ Parameter files in the e.txt format only hold single letters, build n-gram models
+        with from_counts, from_parameters, load or train_ngram_model instead.
+        """
+        raise ValueError('n-gram models cannot be read from e.txt style parameter files')
+
+    @classmethod
+    def from_parameters(cls, names, parameters, priors=None, n=None):
+        """ Builds a model from a 26^n x K parameter matrix, n is found from its number of rows if None.
+        """
+        rows = np.shape(parameters)[0]
+        if n is None:
+            n = max(1, round(math.log(rows, 26)))
+        if rows != 26 ** n:
+            raise ValueError('expected {} parameter rows for n = {}, got {}'.format(26 ** n, n, rows))
+        model = super().from_parameters(names, parameters, priors)
+        model.n = n
+        return model
+
+    @classmethod
+    def from_counts(cls, names, counts, n, alpha=1.0, priors=None):
+        """ Builds the model from a 26^n x K matrix of training counts with additive smoothing alpha.
+        """
+        counts = np.asarray(counts, dtype=np.float64)
+        return cls.from_parameters(names, (counts + alpha) / (counts.sum(axis=0) + 26 ** n * alpha), priors, n)
+
+    def export_text(self, filenames):
+        """ The e.txt format only holds single letters, so only n = 1 models can be exported.
+        """
+        if self.n != 1:
+            raise ValueError('only unigram models can be exported in the e.txt format, this model has n = {}'.format(self.n))
+        super().export_text(filenames)
+
+    def count(self, filename, chunk_size=1 << 24):
+        """ 26^n count vector of a file, to be scored by log_joint.
+        """
+        return ngram_counts(filename, self.n, chunk_size)
+
+    def log_joint(self, counts):
+        """ Sparse dot product of the n-gram counts with the log parameters, plus the log priors.
+
+        Args:
+            counts: a 26^n count vector or an N x 26^n count matrix
+
+        Return:
+            K vector, or N x K matrix, of F values
+        """
+        counts = np.asarray(counts)
+        if counts.ndim == 1:
+            index = np.flatnonzero(counts)
+            return counts[index] @ self.log_parameters[index] + self.log_priors
+        rows, columns = np.nonzero(counts)
+        weights = counts[rows, columns][:, np.newaxis] * self.log_parameters[columns]
+        F = np.column_stack([np.bincount(rows, weights=weights[:, k], minlength=len(counts)) for k in range(len(self.names))])
+        return F + self.log_priors
+
+# train an NgramLanguageModel from labeled corpora, corpora maps each language name to a list or directory of files
+def train_ngram_model(corpora, n=2, alpha=1.0, priors=None, processes=None):
+    counter = functools.partial(ngram_counts, n=n)
+    counts = np.array([count_corpus(list_corpus(corpora[name]), processes, counter=counter, width=26 ** n).sum(axis=0) for name in corpora]).T
+    return NgramLanguageModel.from_counts(list(corpora), counts, n, alpha, priors)
+
 def main():
     filename = 'letter.txt'
     # Q1
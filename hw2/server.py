@@ -0,0 +1,164 @@
+# python imports
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+
+from hw2 import LanguageModel, count_bytes, get_language_model, logsumexp, simplify_english_batch
+
+
+class LanguageService:
+    """ Language identification service that keeps the model in memory.
+
+    Every request is counted as soon as it arrives and queued, and a single batcher task
+    collects the queued requests into micro-batches that are scored with one matrix product.
+    """
+    def __init__(self, model, max_batch=256, max_delay=0.002, history=10000):
+        """ Args:
+            model (LanguageModel): model used to score the requests
+            max_batch (int): largest number of requests scored together
+            max_delay (float): seconds the batcher waits for more requests before scoring
+            history (int): number of recent latencies kept for the percentiles
+        """
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.history = history
+        self.queue = asyncio.Queue()
+        self.latencies = []
+        self.batch_sizes = []
+        self.requests = 0
+
+    async def classify(self, text):
+        """ Queues the count vector of text and waits for the batcher to score it.
+        """
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((count_bytes(text), future))
+        result = await future
+        self.record(self.latencies, time.perf_counter() - start)
+        self.requests += 1
+        return result
+
+    def record(self, values, value):
+        values.append(value)
+        if len(values) > self.history:
+            del values[:len(values) - self.history]
+
+    async def batcher(self):
+        """ Collects queued requests into micro-batches and scores each batch as one count matrix.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.record(self.batch_sizes, len(batch))
+            try:
+                counts = np.array([counts for counts, _ in batch])
+                F = self.model.log_joint(counts)
+                posterior = np.exp(F - logsumexp(F)[:, np.newaxis])
+                # same value as get_conditional_probability_simplify_english for the English/Spanish model
+                english = simplify_english_batch(F) if self.model.names == ['English', 'Spanish'] else None
+                for i, (_, future) in enumerate(batch):
+                    if not future.done():
+                        result = {'language': self.model.names[int(np.argmax(F[i]))],
+                                  'F': dict(zip(self.model.names, F[i].tolist())),
+                                  'posterior': dict(zip(self.model.names, posterior[i].tolist()))}
+                        if english is not None:
+                            result['P_english'] = float(english[i])
+                        future.set_result(result)
+            except Exception as e:
+                # fail the requests of this batch instead of the batcher, so later requests are still served
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def metrics(self):
+        """ Latency percentiles in milliseconds, queue depth and batch sizes.
+        """
+        latencies = np.array(self.latencies) * 1000
+        percentiles = {'p{}'.format(p) : float(np.percentile(latencies, p)) if len(latencies) else None for p in [50, 90, 99]}
+        return {'requests': self.requests,
+                'queue_depth': self.queue.qsize(),
+                'latency_ms': percentiles,
+                'mean_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else None}
+
+    async def handle(self, reader, writer):
+        """ Minimal HTTP/1.1 handler: POST /classify with the text as body, GET /metrics.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, value = line.decode('latin-1').split(':', 1)
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                if method == 'POST' and path == '/classify':
+                    try:
+                        status, response = '200 OK', await self.classify(body)
+                    except Exception as e:
+                        status, response = '500 Internal Server Error', {'error': '{}: {}'.format(type(e).__name__, e)}
+                elif method == 'GET' and path == '/metrics':
+                    status, response = '200 OK', self.metrics()
+                else:
+                    status, response = '404 Not Found', {'error': 'unknown endpoint {} {}'.format(method, path)}
+
+                payload = json.dumps(response).encode('utf-8')
+                writer.write('HTTP/1.1 {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n'.format(status, len(payload)).encode('latin-1') + payload)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    model = LanguageModel.load(args.model) if args.model else get_language_model()
+    service = LanguageService(model, args.max_batch, args.max_delay / 1000)
+    batcher = asyncio.create_task(service.batcher())
+    if args.unix:
+        server = await asyncio.start_unix_server(service.handle, path=args.unix)
+        print('Serving on unix socket {}'.format(args.unix))
+    else:
+        server = await asyncio.start_server(service.handle, host='127.0.0.1', port=args.port)
+        print('Serving on http://127.0.0.1:{}'.format(args.port))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher.cancel()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Language identification service')
+    parser.add_argument('--port', default=8540, type=int,
+                        help='localhost port to listen on')
+    parser.add_argument('--unix', default='', type=str, metavar='PATH',
+                        help='listen on this unix socket instead of a port')
+    parser.add_argument('--model', default='', type=str, metavar='PATH',
+                        help='binary model written by train_language.py (default: e.txt and s.txt)')
+    parser.add_argument('--max-batch', default=256, type=int, metavar='N',
+                        help='largest number of requests scored together')
+    parser.add_argument('--max-delay', default=2.0, type=float, metavar='MS',
+                        help='milliseconds to wait for more requests before scoring a batch')
+    args = parser.parse_args()
+    asyncio.run(serve(args))
@@ -0,0 +1,40 @@
+# python imports
+import os
+import argparse
+
+from hw2 import LanguageModel, train_language_model
+
+
+# main function for training a language model
+def main(args):
+    corpora = {language[0] : language[1:] for language in args.language}
+    model = train_language_model(corpora, alpha=args.alpha, priors=args.priors, processes=args.processes)
+    model.save(args.output, alpha=args.alpha)
+    print('Saved {} languages to {}'.format(len(model.names), args.output))
+
+    if args.export_text:
+        os.makedirs(args.export_text, exist_ok=True)
+        # e.txt style files named after the lowercase language name
+        model.export_text({name : os.path.join(args.export_text, '{}.txt'.format(name.lower())) for name in model.names})
+        print('Exported text parameters to {}'.format(args.export_text))
+
+    # check that the saved model loads back
+    LanguageModel.load(args.output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train character parameter vectors for language identification')
+    parser.add_argument('--language', nargs='+', action='append', required=True, metavar='NAME PATH',
+                        help='language name followed by its files or directories, may be repeated')
+    parser.add_argument('--alpha', default=1.0, type=float,
+                        help='additive smoothing added to every letter count')
+    parser.add_argument('--priors', nargs='+', default=None, type=float,
+                        help='prior probability of each language (default: uniform)')
+    parser.add_argument('--processes', default=None, type=int, metavar='N',
+                        help='number of counting processes (default: number of cores, or 1 for corpora under 8 MB)')
+    parser.add_argument('--output', default='model.lm', type=str, metavar='PATH',
+                        help='binary model file to write')
+    parser.add_argument('--export-text', default='', type=str, metavar='DIR',
+                        help='also write the parameters in the e.txt format to this directory')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+import hw3
+
+# benchmarks are run from the hw3-supplementary directory
+DATASET = 'YaleB_32x32.npy'
+
+# time a function, returning the best of a few runs and the result of the last one
+def best_time(function, runs=3):
+    best = np.inf
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+# faces upscaled to size x size with a little noise, so the larger images are not rank deficient
+def upscaled_faces(size, n, random_state=0):
+    rng = np.random.default_rng(random_state)
+    faces = np.load(DATASET)[:n].reshape(n, 32, 32).astype(np.float64)
+    scale = size // 32
+    faces = np.repeat(np.repeat(faces, scale, axis=1), scale, axis=2).reshape(n, size * size)
+    faces += rng.normal(scale=1.0, size=faces.shape)
+    return faces - np.mean(faces, axis=0)
+
+# time of the covariance, Gram and randomized PCA paths across image sizes, and their eigenvalue error
+def benchmark_pca(sizes=(32, 64, 128), n=1000, m=50, max_covariance_dim=4096):
+    print('top {} components of {} faces'.format(m, n))
+    print('{:>6}{:>8}{:>12}{:>12}{:>16}'.format('size', 'd', 'method', 'seconds', 'eigval error'))
+    for size in sizes:
+        dataset = upscaled_faces(size, n)
+        d = dataset.shape[1]
+        # the Gram path is exact, so it is the reference for the eigenvalues
+        reference = None
+        for method in ['gram', 'randomized', 'covariance', 'auto']:
+            if method == 'covariance' and d > max_covariance_dim:
+                print('{:>6}{:>8}{:>12}{:>12}{:>16}'.format(size, d, method, 'skipped', ''))
+                continue
+            elapsed, (eigvals, _) = best_time(lambda: hw3.get_eig_dataset(dataset, m, method))
+            eigvals = np.diag(eigvals)
+            reference = eigvals if reference is None else reference
+            error = np.max(np.abs(eigvals - reference) / reference)
+            print('{:>6}{:>8}{:>12}{:>12.3f}{:>16.2e}'.format(size, d, method, elapsed, error))
+
+# reconstruction of the whole dataset with the per-image project_image loop against project_images
+def benchmark_projection(m=100):
+    dataset = hw3.load_and_center_dataset(DATASET)
+    _, U = hw3.get_eig(hw3.get_covariance(dataset), m)
+    loop_time, loop = best_time(lambda: np.array([hw3.project_image(image, U) for image in dataset]))
+    batch_time, (batch, _) = best_time(lambda: hw3.project_images(dataset, U))
+    single_time, (single, _) = best_time(lambda: hw3.project_images(dataset, U, np.float32))
+    mean = np.mean(np.load(DATASET), axis=0)
+    streaming_time, _ = best_time(lambda: hw3.project_dataset(DATASET, U, mean, chunk_rows=256))
+    assert np.allclose(loop, batch)
+
+    print('reconstruction of {} images with m = {}'.format(len(dataset), m))
+    print('{:<28}{:>12}{:>14}'.format('method', 'images/s', 'max error'))
+    print('{:<28}{:>12.0f}{:>14}'.format('project_image loop', len(dataset) / loop_time, ''))
+    print('{:<28}{:>12.0f}{:>14.2e}'.format('project_images float64', len(dataset) / batch_time, np.abs(batch - loop).max()))
+    print('{:<28}{:>12.0f}{:>14.2e}'.format('project_images float32', len(dataset) / single_time, np.abs(single - loop).max()))
+    print('{:<28}{:>12.0f}{:>14}'.format('project_dataset mmap', len(dataset) / streaming_time, ''))
+
+# fraction of the exact neighbours that were found, averaged over the queries
+def recall(indices, exact):
+    return np.mean([len(np.intersect1d(indices[i], exact[i])) / exact.shape[1] for i in range(len(exact))])
+
+# query latency and recall of the eigenface indexes against exact search in pixel space
+def benchmark_index(m=50, k=10, queries=200):
+    gallery = np.load(DATASET).astype(np.float64)
+    mean = np.mean(gallery, axis=0)
+    _, U = hw3.get_eig(hw3.get_covariance(gallery - mean), m)
+    rng = np.random.default_rng(0)
+    # queries are gallery images with some pixel noise
+    images = gallery[rng.choice(len(gallery), queries, replace=False)] + rng.normal(scale=5.0, size=(queries, gallery.shape[1]))
+
+    # exact k nearest neighbours of the raw images, without any projection
+    exact_squared = np.sum(images ** 2, axis=1)[:, np.newaxis] + np.sum(gallery ** 2, axis=1) - 2 * np.dot(images, gallery.T)
+    exact = np.argsort(exact_squared, axis=1)[:, :k]
+
+    brute = hw3.EigenfaceIndex(gallery, U, mean, 'brute')
+    _, projected = brute.query(images, k)
+    print('{} queries, k = {}, m = {}, gallery of {}'.format(queries, k, m, len(gallery)))
+    print('{:<20}{:>14}{:>16}{:>16}'.format('index', 'ms / query', 'recall pixels', 'recall brute'))
+    for name, index, eps in [('brute', brute, 0.0), ('tree', hw3.EigenfaceIndex(gallery, U, mean, 'tree'), 0.0), ('tree eps=0.5', hw3.EigenfaceIndex(gallery, U, mean, 'tree'), 0.5)]:
+        elapsed, (_, indices) = best_time(lambda: index.query(images, k, eps))
+        print('{:<20}{:>14.4f}{:>16.3f}{:>16.3f}'.format(name, elapsed / queries * 1000, recall(indices, exact), recall(indices, projected)))
+
+# images per second of display_image figures saved one by one against render_montages
+def benchmark_render(m=100, figures=50):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    dataset = hw3.load_and_center_dataset(DATASET)
+    _, U = hw3.get_eig(hw3.get_covariance(dataset), m)
+    projections, _ = hw3.project_images(dataset, U)
+    directory = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        for i in range(figures):
+            fig, _, _ = hw3.display_image(dataset[i], projections[i])
+            fig.savefig(os.path.join(directory, 'figure_{}.png'.format(i)))
+            plt.close(fig)
+        figure_rate = figures / (time.perf_counter() - start)
+        filenames, montage_rate = hw3.render_montages(dataset, projections, os.path.join(directory, 'montage'))
+        print('rendering original/projection pairs')
+        print('{:<28}{:>12.0f} images/s'.format('display_image + savefig', figure_rate))
+        print('{:<28}{:>12.0f} images/s ({} pages for {} images)'.format('render_montages', montage_rate, len(filenames), len(dataset)))
+    finally:
+        shutil.rmtree(directory)
+
+# scaling of get_covariance_sharded from 1 to max_workers workers on the dataset tiled repeat times
+def benchmark_sharded(repeat=10, max_workers=None, blas_threads=1):
+    max_workers = max_workers or os.cpu_count() or 1
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'tiled.npy')
+        np.save(filename, np.tile(np.load(DATASET), (repeat, 1)))
+        _, expected = hw3.get_covariance_streaming(filename)
+        print('sharded covariance of {} rows, {} BLAS thread(s) per worker'.format(len(np.load(filename, mmap_mode='r')), blas_threads))
+        print('{:>8}{:>12}{:>12}{:>12}'.format('workers', 'seconds', 'speedup', 'efficiency'))
+        single_time = None
+        # powers of two up to max_workers, and max_workers itself
+        steps = sorted(set([2 ** i for i in range(max_workers.bit_length()) if 2 ** i <= max_workers] + [max_workers]))
+        for workers in steps:
+            elapsed, (_, S) = best_time(lambda: hw3.get_covariance_sharded(filename, workers, blas_threads=blas_threads))
+            assert np.allclose(S, expected)
+            single_time = single_time or elapsed
+            print('{:>8}{:>12.3f}{:>12.2f}{:>12.2f}'.format(workers, elapsed, single_time / elapsed, single_time / elapsed / workers))
+    finally:
+        shutil.rmtree(directory)
+
+def main():
+    benchmarks = {'pca': benchmark_pca, 'projection': benchmark_projection, 'index': benchmark_index, 'render': benchmark_render, 'sharded': benchmark_sharded}
+    names = sys.argv[1:] or list(benchmarks)
+    for name in names:
+        benchmarks[name]()
+
+if __name__ == '__main__':
+    main()
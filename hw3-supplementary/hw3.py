@@ -1,4 +1,13 @@
 from scipy.linalg import eigh
+from scipy.linalg.blas import dgemm
+from scipy.spatial import cKDTree
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import multiprocessing
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -13,6 +22,100 @@ def load_and_center_dataset(filename):
 def get_covariance(dataset):
     return np.dot(dataset.T, dataset) / (dataset.shape[0] - 1)
 
+# memory-map a .npy dataset and yield it in float64 chunks of chunk_rows rows, each row flattened to d values
+# start and end restrict the chunks to the rows [start, end)
+def iter_chunks(filename, chunk_rows=1024, start=0, end=None):
+    ds = np.load(filename, mmap_mode='r')
+    ds = ds.reshape(ds.shape[0], -1)
+    end = ds.shape[0] if end is None else min(end, ds.shape[0])
+    for first in range(start, end, chunk_rows):
+        yield np.asarray(ds[first:min(first + chunk_rows, end)], dtype=np.float64)
+
+# M2 += alpha * rows^T rows in place with one dgemm
+# M2 is symmetric, so its transpose is the Fortran-ordered matrix BLAS updates without making a copy
+def add_gram(M2, rows, alpha=1.0):
+    dgemm(alpha, rows.T, rows.T, beta=1.0, c=M2.T, trans_b=True, overwrite_c=True)
+
+# add one chunk to the count, mean and centered sum of squares M2 in place, with the pairwise update of Chan, Golub and LeVeque
+# the chunk is centered on its own mean, and the correction n_a n_b / n * delta delta^T is appended to it as one more row,
+# so the chunk and the correction go into M2 with a single dgemm and no d x d temporary
+def update_moments(moments, chunk):
+    n_a, mean_a, M2 = moments
+    n_b = chunk.shape[0]
+    if M2 is None:
+        M2 = np.zeros((chunk.shape[1], chunk.shape[1]))
+    n = n_a + n_b
+    mean_b = np.mean(chunk, axis=0)
+    rows = np.empty((n_b + 1, chunk.shape[1]))
+    np.subtract(chunk, mean_b, out=rows[:n_b])
+    rows[n_b] = (mean_b - mean_a) * np.sqrt(n_a * n_b / n)
+    add_gram(M2, rows)
+    return n, mean_a + (mean_b - mean_a) * (n_b / n), M2
+
+# merge the moments b into the moments a, the M2 of a is updated in place
+def merge_moments(a, b):
+    n_a, mean_a, M2_a = a
+    n_b, mean_b, M2_b = b
+    if n_a == 0:
+        return b
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    M2_a += M2_b
+    add_gram(M2_a, delta[np.newaxis], n_a * n_b / n)
+    return n, mean_a + delta * (n_b / n), M2_a
+
+# mean and covariance of a .npy dataset larger than memory, accumulated chunk by chunk from a memory map
+# peak memory is one chunk plus the d x d covariance, and the result matches get_covariance(load_and_center_dataset(filename))
+def get_covariance_streaming(filename, chunk_rows=1024):
+    n, mean, M2 = shard_moments(filename, 0, None, chunk_rows)
+    M2 /= n - 1
+
+    return mean, M2
+
+# moments of the rows [start, end) of a .npy dataset, run in a worker process of get_covariance_sharded
+def shard_moments(filename, start, end, chunk_rows=1024):
+    moments = (0, 0.0, None)
+    for chunk in iter_chunks(filename, chunk_rows, start, end):
+        moments = update_moments(moments, chunk)
+    return moments
+
+# environment variables read by the BLAS libraries numpy may be linked against
+BLAS_THREAD_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'BLIS_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS')
+
+# same result as get_covariance_streaming, with the rows split into one shard per worker process
+# each worker reads its own slice of the memory-mapped file and computes partial moments, which are merged pairwise
+# blas_threads pins the BLAS threads of every worker, so workers x blas_threads does not oversubscribe the cores
+def get_covariance_sharded(filename, workers=None, chunk_rows=1024, blas_threads=None):
+    workers = workers or os.cpu_count() or 1
+    n = np.load(filename, mmap_mode='r').shape[0]
+    bounds = [n * i // workers for i in range(workers + 1)]
+    shards = [(filename, bounds[i], bounds[i + 1], chunk_rows) for i in range(workers) if bounds[i] < bounds[i + 1]]
+    if workers == 1:
+        partials = [shard_moments(*shard) for shard in shards]
+    elif blas_threads is None:
+        with multiprocessing.Pool(workers) as pool:
+            partials = pool.starmap(shard_moments, shards)
+    else:
+        # BLAS reads the variables when numpy is imported, so the workers are spawned fresh with them set
+        saved = {name : os.environ.get(name) for name in BLAS_THREAD_VARIABLES}
+        os.environ.update({name : str(blas_threads) for name in BLAS_THREAD_VARIABLES})
+        try:
+            with multiprocessing.get_context('spawn').Pool(workers) as pool:
+                partials = pool.starmap(shard_moments, shards)
+        finally:
+            for name in saved:
+                if saved[name] is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = saved[name]
+    moments = (0, 0.0, None)
+    for partial in partials:
+        moments = merge_moments(moments, partial)
+    n, mean, M2 = moments
+    M2 /= n - 1
+
+    return mean, M2
+
 def get_eig(S, m):
     eigvals, eigvecs = eigh(S, subset_by_index=[S.shape[0] - m, S.shape[0] - 1])
     # Return the largest m eigenvalues as a diagonal matrix in reversed order
@@ -34,6 +137,88 @@ def get_eig_prop(S, prop):
     
     return eigvals, eigvecs
 
+# top m eigenvalues and eigenvectors of the covariance of a centered n x d dataset through the n x n Gram matrix
+# X X^T and X^T X share their nonzero eigenvalues, and U = X^T V / sqrt(eigenvalue), so this never builds the d x d covariance
+def get_eig_gram(dataset, m):
+    n = dataset.shape[0]
+    gram = np.dot(dataset, dataset.T) / (n - 1)
+    eigvals, V = eigh(gram, subset_by_index=[n - m, n - 1])
+    eigvals, V = eigvals[::-1], V[:, ::-1]
+    eigvecs = np.dot(dataset.T, V)
+    # normalize the columns, equal to dividing by sqrt((n - 1) * eigenvalue) but safe for tiny eigenvalues
+    eigvecs = eigvecs / np.linalg.norm(eigvecs, axis=0)
+
+    return np.diag(eigvals), eigvecs
+
+# top m eigenvalues and eigenvectors of the covariance of a centered dataset with a randomized truncated SVD
+# oversampling and power iterations make the top of the spectrum accurate, see Halko, Martinsson and Tropp (2011)
+def get_eig_randomized(dataset, m, oversampling=10, power_iterations=4, random_state=0):
+    n, d = dataset.shape
+    rng = np.random.default_rng(random_state)
+    k = min(m + oversampling, n, d)
+    # orthonormal basis of the range of X^T, refined by power iterations with re-orthonormalization
+    Q, _ = np.linalg.qr(np.dot(dataset.T, rng.standard_normal((n, k))))
+    for _ in range(power_iterations):
+        Q, _ = np.linalg.qr(np.dot(dataset, Q))
+        Q, _ = np.linalg.qr(np.dot(dataset.T, Q))
+    # SVD of the small n x k projection, X ~ (X Q) Q^T
+    _, singular_values, Vt = np.linalg.svd(np.dot(dataset, Q), full_matrices=False)
+    eigvals = singular_values[:m] ** 2 / (n - 1)
+    eigvecs = np.dot(Q, Vt[:m].T)
+
+    return np.diag(eigvals), eigvecs
+
+# same output as get_eig(get_covariance(dataset), m), picking the cheapest way to get it from the centered dataset
+# method is 'covariance' for the d x d covariance, 'gram' for the n x n Gram matrix, 'randomized', or 'auto'
+def get_eig_dataset(dataset, m, method='auto', max_covariance_dim=2048):
+    if method == 'auto':
+        n, d = dataset.shape
+        if n < d:
+            method = 'gram'
+        elif d <= max_covariance_dim:
+            method = 'covariance'
+        else:
+            method = 'randomized'
+    if method == 'gram':
+        return get_eig_gram(dataset, m)
+    if method == 'randomized':
+        return get_eig_randomized(dataset, m)
+    if method == 'covariance':
+        return get_eig(get_covariance(dataset), m)
+    raise ValueError('unknown PCA method {}'.format(method))
+
+class PCAModel:
+    """ Full eigendecomposition of a covariance matrix, computed once and reused.
+
+    get_eig and get_eig_prop each decompose S again, so a sweep over many m or prop values
+    pays for O(d^3) work every time. PCAModel sorts the spectrum and basis once, after which
+    top_m and by_proportion only slice them in O(d m).
+    """
+    def __init__(self, S):
+        """ Decomposes the covariance matrix S.
+
+        Args:
+            S (d x d array): covariance matrix, e.g. from get_covariance
+        """
+        eigvals, eigvecs = eigh(S)
+        # sum of all eigenvalues, summed in the ascending order eigh returns them in, same as get_eig_prop
+        self.total_variance = np.sum(eigvals)
+        # the eigenvalues in decreasing order, and the eigenvectors reordered to match
+        self.eigvals = eigvals[::-1].copy()
+        self.eigvecs = np.ascontiguousarray(eigvecs[:, ::-1])
+
+    def top_m(self, m):
+        """ Same as get_eig(S, m): the largest m eigenvalues as a diagonal matrix and their eigenvectors.
+        """
+        return np.diag(self.eigvals[:m]), self.eigvecs[:, :m]
+
+    def by_proportion(self, prop):
+        """ Same as get_eig_prop(S, prop): the eigenvalues above prop times the total variance and their eigenvectors.
+        """
+        # eigh with subset_by_value keeps the half-open interval (prop * total, inf]
+        m = int(np.count_nonzero(self.eigvals > self.total_variance * prop))
+        return self.top_m(m)
+
 def project_image(image, U):
     # calculate the projection of the image onto the eigenvectors
     projection = np.dot(np.transpose(U), image)
@@ -42,6 +227,318 @@ def project_image(image, U):
 
     return reconstruction
 
+# project and reconstruct every row of an N x d array of centered images with two matrix products
+# returns the N x d reconstructions, same as project_image on each row, and the Euclidean reconstruction error of each image
+# dtype=np.float32 halves the memory traffic at the cost of about 1e-6 relative error
+def project_images(images, U, dtype=np.float64):
+    images = np.asarray(images, dtype=dtype)
+    U = np.asarray(U, dtype=dtype)
+    # N x m coefficients, then back to N x d
+    reconstructions = np.dot(np.dot(images, U), U.T)
+    errors = np.linalg.norm(images - reconstructions, axis=1)
+
+    return reconstructions, errors
+
+# project_images over a .npy dataset chunk by chunk from a memory map, centering each chunk with mean
+# the reconstructions are written to out (e.g. an np.lib.format.open_memmap array) when given, the errors are returned
+def project_dataset(filename, U, mean, chunk_rows=1024, dtype=np.float64, out=None):
+    errors = []
+    start = 0
+    for chunk in iter_chunks(filename, chunk_rows):
+        reconstructions, chunk_errors = project_images(chunk - mean, U, dtype)
+        if out is not None:
+            out[start:start + len(chunk)] = reconstructions
+        errors.append(chunk_errors)
+        start += len(chunk)
+
+    return np.concatenate(errors)
+
+class EigenfaceIndex:
+    """ k-nearest-neighbour search of faces in the space spanned by an eigenbasis.
+
+    The gallery is projected once into m dimensions. Queries are raw images, centered with the
+    gallery mean and projected with the same U^T image product as project_image. Search is either
+    brute force, with batched matrix products, or a k-d tree, both behind query.
+    """
+    def __init__(self, gallery, U, mean, method='brute', leafsize=16):
+        """ Projects the gallery.
+
+        Args:
+            gallery (N x d array): raw images, e.g. np.load('YaleB_32x32.npy')
+            U (d x m array): eigenvectors from get_eig
+            mean (d array): mean image used to center the gallery and the queries
+            method (str): 'brute' or 'tree'
+            leafsize (int): leaf size of the k-d tree
+        """
+        if method not in ('brute', 'tree'):
+            raise ValueError('unknown search method {}'.format(method))
+        self.U = np.asarray(U, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.method = method
+        self.coefficients = self.project(gallery)
+        # squared norms of the gallery coefficients, for ||q - g||^2 = ||q||^2 + ||g||^2 - 2 q . g
+        self.squared_norms = np.sum(self.coefficients ** 2, axis=1)
+        self.tree = cKDTree(self.coefficients, leafsize=leafsize) if method == 'tree' else None
+
+    def project(self, images):
+        """ m coefficients of each raw image.
+        """
+        images = np.asarray(images, dtype=np.float64).reshape(-1, self.mean.shape[0])
+        return np.dot(images - self.mean, self.U)
+
+    def query(self, images, k=1, eps=0.0):
+        """ The k nearest gallery images of each query image.
+
+        Args:
+            images: a raw image or a Q x d array of raw images
+            k (int): number of neighbours
+            eps (float): approximation factor of the tree search, the k-th neighbour is within (1 + eps) of the exact one
+
+        Return:
+            Q x k distances in the projected space and Q x k gallery indices, closest first
+        """
+        queries = self.project(images)
+        k = min(k, len(self.coefficients))
+        if self.method == 'tree':
+            distances, indices = self.tree.query(queries, k=k, eps=eps)
+            return distances.reshape(len(queries), k), indices.reshape(len(queries), k)
+        squared = np.sum(queries ** 2, axis=1)[:, np.newaxis] + self.squared_norms - 2 * np.dot(queries, self.coefficients.T)
+        # rounding can make the squared distance of identical images slightly negative
+        np.maximum(squared, 0, out=squared)
+        indices = np.argpartition(squared, k - 1, axis=1)[:, :k]
+        rows = np.arange(len(queries))[:, np.newaxis]
+        order = np.argsort(squared[rows, indices], axis=1, kind='stable')
+        indices = indices[rows, order]
+        return np.sqrt(squared[rows, indices]), indices
+
+# mean squared reconstruction error of the dataset for every m = 1..d, from one sorted eigenbasis
+# with the coefficients C = X U, the error of an image with m components is ||x||^2 minus the sum of its first m squared
+# coefficients, so one matrix product and a cumulative sum replace d separate get_eig and project_image calls
+# returns the errors and the proportion of variance explained by the first m components, errors[m - 1] is the error for m
+def get_reconstruction_errors(dataset, model=None):
+    if model is None:
+        model = PCAModel(get_covariance(dataset))
+    coefficients = np.dot(dataset, model.eigvecs)
+    # energy of each component summed over the dataset, equal to (n - 1) times its eigenvalue
+    energy = np.sum(coefficients ** 2, axis=0)
+    total = np.sum(dataset ** 2)
+    # clamp the rounding error of the last few m, where the error should be exactly 0
+    errors = np.maximum(total - np.cumsum(energy), 0) / dataset.shape[0]
+    variance_ratio = np.cumsum(model.eigvals) / model.total_variance
+
+    return errors, variance_ratio
+
+# smallest m whose mean squared reconstruction error is at most max_error and whose explained variance is at least
+# min_variance, from the output of get_reconstruction_errors, or None if no m meets both targets
+def choose_m(errors, variance_ratio, max_error=None, min_variance=None):
+    meets = np.ones(len(errors), dtype=bool)
+    if max_error is not None:
+        meets &= errors <= max_error
+    if min_variance is not None:
+        meets &= variance_ratio >= min_variance
+    if not np.any(meets):
+        return None
+    return int(np.argmax(meets)) + 1
+
+# fingerprint of a dataset file and the parameters computed from it, without reading the whole file
+# the size, modification time and a hash of samples blocks spread over the file identify the content
+def fingerprint(filename, samples=16, block_size=1 << 16, **params):
+    stat = os.stat(filename)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps({'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'params': params}, sort_keys=True).encode('utf-8'))
+    with open(filename, 'rb') as f:
+        for i in range(samples):
+            f.seek(max(0, stat.st_size - block_size) * i // max(1, samples - 1))
+            digest.update(f.read(block_size))
+    return digest.hexdigest()
+
+class PCACache:
+    """ On-disk cache of PCA bases keyed by dataset fingerprint.
+
+    Each entry is a directory of .npy files (mean, eigvals, eigvecs) that is loaded with mmap on
+    a hit. When the cache grows past max_bytes, the least recently used entries are evicted.
+    """
+    ARRAYS = ('mean', 'eigvals', 'eigvecs')
+
+    def __init__(self, directory, max_bytes=1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """ The cached (mean, eigvals, eigvecs) memory-mapped, or None on a miss.
+        """
+        path = self.path(key)
+        if not os.path.isdir(path):
+            return None
+        # touch the entry so that eviction sees it as recently used
+        os.utime(path)
+        return tuple(np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in self.ARRAYS)
+
+    def put(self, key, mean, eigvals, eigvecs):
+        """ Stores an entry, then evicts old entries down to max_bytes.
+        """
+        # write to a temporary directory and rename it, so a crash never leaves a partial entry
+        temporary = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        for name, array in zip(self.ARRAYS, (mean, eigvals, eigvecs)):
+            np.save(os.path.join(temporary, name + '.npy'), array)
+        try:
+            os.rename(temporary, self.path(key))
+        except OSError:
+            # another process stored the same entry first
+            shutil.rmtree(temporary)
+        self.evict()
+
+    def entries(self):
+        """ (last use time, size in bytes, key) of every entry, oldest first.
+        """
+        entries = []
+        for key in os.listdir(self.directory):
+            path = self.path(key)
+            if key.startswith('.') or not os.path.isdir(path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+            entries.append((os.path.getmtime(path), size, key))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        # always keep the newest entry, even if it is larger than the limit on its own
+        for _, size, key in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self.path(key), ignore_errors=True)
+            total -= size
+
+# mean, eigenvalues (decreasing) and top m eigenvectors of a .npy dataset, reused from cache when the dataset is unchanged
+# on a miss the covariance is streamed with get_covariance_streaming and decomposed once, m=None keeps the whole basis
+def get_pca_cached(filename, m=None, cache=None, chunk_rows=1024):
+    if cache is None:
+        return get_pca_uncached(filename, m, chunk_rows)
+    key = fingerprint(filename, m=m)
+    entry = cache.get(key)
+    if entry is None:
+        entry = get_pca_uncached(filename, m, chunk_rows)
+        cache.put(key, *entry)
+        entry = cache.get(key) or entry
+    return entry
+
+def get_pca_uncached(filename, m=None, chunk_rows=1024):
+    mean, S = get_covariance_streaming(filename, chunk_rows)
+    model = PCAModel(S)
+    eigvecs = model.eigvecs if m is None else model.eigvecs[:, :m]
+    return mean, model.eigvals, eigvecs
+
+# identifies the files written by PCAStore.create, the last byte is the format version
+STORE_MAGIC = b'HW3PCA\x01'
+# the arrays of a store start on multiples of this many bytes
+STORE_ALIGNMENT = 64
+
+class PCAStore:
+    """ Compressed image store built on an eigenbasis.
+
+    The file holds a JSON header, the mean image, the d x m basis and an N x m coefficient matrix.
+    The mean and basis are loaded when the store is opened, the coefficients stay memory-mapped,
+    so decoding any image or slice only reads its m coefficients and costs O(m d).
+    """
+    def __init__(self, filename):
+        """ Opens a store written by PCAStore.create.
+        """
+        with open(filename, 'rb') as f:
+            if f.read(len(STORE_MAGIC)) != STORE_MAGIC:
+                raise ValueError('{} is not a PCA store'.format(filename))
+            header_length = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+            self.header = json.loads(f.read(header_length))
+        n, d, m = self.header['n'], self.header['d'], self.header['m']
+        offsets = self.header['offsets']
+        self.filename = filename
+        self.mean = np.fromfile(filename, dtype='<f8', count=d, offset=offsets['mean'])
+        self.U = np.fromfile(filename, dtype='<f8', count=d * m, offset=offsets['basis']).reshape(d, m)
+        self.coefficients = np.memmap(filename, dtype=self.header['dtype'], mode='r', offset=offsets['coefficients'], shape=(n, m))
+
+    @classmethod
+    def create(cls, filename, images, U, mean, dtype=np.float32, chunk_rows=1024):
+        """ Encodes raw images into a new store, chunk by chunk.
+
+        Args:
+            filename (str): store to write
+            images: N x d array, or the filename of a .npy dataset which is read through a memory map
+            U (d x m array): eigenvectors from get_eig
+            mean (d array): mean image subtracted before projecting
+            dtype: type of the stored coefficients
+        """
+        U = np.asarray(U, dtype='<f8')
+        mean = np.asarray(mean, dtype='<f8')
+        d, m = U.shape
+        if isinstance(images, str):
+            n = np.load(images, mmap_mode='r').shape[0]
+            chunks = iter_chunks(images, chunk_rows)
+        else:
+            images = np.asarray(images).reshape(len(images), -1)
+            n = images.shape[0]
+            chunks = (images[start:start + chunk_rows] for start in range(0, n, chunk_rows))
+
+        # lay out the mean, basis and coefficients after the header, each on an aligned offset
+        def align(offset):
+            return -(-offset // STORE_ALIGNMENT) * STORE_ALIGNMENT
+        header = {'n': n, 'd': d, 'm': m, 'dtype': np.dtype(dtype).newbyteorder('<').str, 'offsets': {}}
+        # the header length does not depend on the offsets, which are at most a few digits longer than the placeholders
+        header_size = len(STORE_MAGIC) + 4 + len(json.dumps(dict(header, offsets={'mean': 10 ** 18, 'basis': 10 ** 18, 'coefficients': 10 ** 18})))
+        header['offsets']['mean'] = align(header_size)
+        header['offsets']['basis'] = align(header['offsets']['mean'] + mean.nbytes)
+        header['offsets']['coefficients'] = align(header['offsets']['basis'] + U.nbytes)
+        encoded = json.dumps(header).encode('utf-8')
+
+        with open(filename, 'wb') as f:
+            f.write(STORE_MAGIC + np.array([len(encoded)], dtype='<u4').tobytes() + encoded)
+            f.seek(header['offsets']['mean'])
+            f.write(mean.tobytes())
+            f.seek(header['offsets']['basis'])
+            f.write(U.tobytes())
+            f.seek(header['offsets']['coefficients'])
+            for chunk in chunks:
+                f.write(np.dot(np.asarray(chunk, dtype=np.float64) - mean, U).astype(header['dtype']).tobytes())
+        return cls(filename)
+
+    def __len__(self):
+        return self.coefficients.shape[0]
+
+    def encode(self, images):
+        """ m coefficients of each raw image, the same projection as create.
+        """
+        images = np.asarray(images, dtype=np.float64).reshape(-1, self.mean.shape[0])
+        return np.dot(images - self.mean, self.U)
+
+    def decode(self, index):
+        """ Raw-space reconstruction of the image, slice or array of indices index.
+        """
+        coefficients = np.asarray(self.coefficients[index], dtype=np.float64)
+        return np.dot(coefficients, self.U.T) + self.mean
+
+    def compression_ratio(self, raw_itemsize=1):
+        """ Size of the raw images, with raw_itemsize bytes per pixel, over the size of the store file.
+        """
+        return len(self) * self.mean.shape[0] * raw_itemsize / os.path.getsize(self.filename)
+
+    def reconstruction_error(self, images, chunk_rows=1024):
+        """ Root mean squared pixel error of the stored images against the raw images, an array or a .npy filename.
+        """
+        if isinstance(images, str):
+            chunks = iter_chunks(images, chunk_rows)
+        else:
+            images = np.asarray(images).reshape(len(images), -1)
+            chunks = (images[start:start + chunk_rows] for start in range(0, len(images), chunk_rows))
+        squared, count, start = 0.0, 0, 0
+        for chunk in chunks:
+            squared += np.sum((self.decode(slice(start, start + len(chunk))) - chunk) ** 2)
+            count += chunk.size
+            start += len(chunk)
+        return np.sqrt(squared / count)
+
 def display_image(orig, proj):
     # reshape the original image and the projection, transpose to rotate the image
     orig = np.transpose(orig.reshape(32, 32))
@@ -56,4 +553,48 @@ def display_image(orig, proj):
     fig.colorbar(ax1_pos)
     fig.colorbar(ax2_pos)
 
-    return fig, ax1, ax2
\ No newline at end of file
+    return fig, ax1, ax2
+
+# color a stack of N x h x w images with a colormap lookup table, each image scaled to its own min and max like imshow
+def colorize_images(images, cmap='viridis'):
+    low = images.min(axis=(1, 2), keepdims=True)
+    high = images.max(axis=(1, 2), keepdims=True)
+    # constant images map to the bottom of the colormap instead of dividing by zero
+    scaled = (images - low) / np.where(high > low, high - low, 1)
+    lut = (plt.get_cmap(cmap)(np.linspace(0, 1, 256))[:, :3] * 255).astype(np.uint8)
+    return lut[np.round(scaled * 255).astype(np.uint8)]
+
+# tile original/projection pairs into one RGB array per page, the pair of image i is drawn side by side like display_image
+def tile_pairs(orig, proj, columns=8, shape=(32, 32), padding=2, cmap='viridis'):
+    n = orig.shape[0]
+    h, w = shape
+    # reshape and transpose to rotate the images, same as display_image
+    pairs = np.stack([orig.reshape(n, h, w), proj.reshape(n, h, w)], axis=1).transpose(0, 1, 3, 2)
+    tiles = colorize_images(pairs.reshape(2 * n, w, h), cmap).reshape(n, 2, w, h, 3)
+    rows = -(-n // columns)
+    cell_h, cell_w = w + padding, 2 * h + 2 * padding
+    montage = np.full((rows * cell_h + padding, columns * cell_w + padding, 3), 255, dtype=np.uint8)
+    for i in range(n):
+        top = padding + (i // columns) * cell_h
+        left = padding + (i % columns) * cell_w
+        montage[top:top + w, left:left + h] = tiles[i, 0]
+        montage[top:top + w, left + h + padding:left + 2 * h + padding] = tiles[i, 1]
+    return montage
+
+# render thousands of original/projection pairs into PNG pages named prefix_000.png, prefix_001.png, ...
+# no matplotlib figure is created, the pages are written straight from the tiled arrays
+# returns the page filenames and the number of pairs rendered per second
+def render_montages(orig, proj, prefix, columns=8, rows=8, shape=(32, 32), cmap='viridis'):
+    start = time.perf_counter()
+    orig = np.asarray(orig, dtype=np.float64).reshape(len(orig), -1)
+    proj = np.asarray(proj, dtype=np.float64).reshape(len(proj), -1)
+    per_page = columns * rows
+    filenames = []
+    for page, first in enumerate(range(0, len(orig), per_page)):
+        montage = tile_pairs(orig[first:first + per_page], proj[first:first + per_page], columns, shape, cmap=cmap)
+        filename = '{}_{:03d}.png'.format(prefix, page)
+        plt.imsave(filename, montage)
+        filenames.append(filename)
+    elapsed = time.perf_counter() - start
+
+    return filenames, len(orig) / elapsed if elapsed > 0 else float('inf')
@@ -0,0 +1,123 @@
+import sys
+import time
+import tracemalloc
+import numpy as np
+from scipy.cluster.hierarchy import linkage, fcluster, is_monotonic
+import hw4
+
+# benchmarks are run from the hw4 directory
+DATASET = 'countries.csv'
+
+# time a function, returning the best of a few runs and the result of the last one
+def best_time(function, runs=3):
+    best = np.inf
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+# normalized country features, and random points to reach larger sizes
+def datasets(sizes=(1000, 3000)):
+    features = np.array(hw4.normalize_features([hw4.calc_features(row) for row in hw4.load_data(DATASET)]))
+    rng = np.random.default_rng(0)
+    yield 'countries', features
+    for n in sizes:
+        yield 'random {}'.format(n), rng.normal(size=(n, features.shape[1]))
+
+# every linkage of hac against scipy.cluster.hierarchy.linkage, same merges and distances, and their runtimes
+def benchmark_linkage():
+    print('{:<14}{:>10}{:>10}{:>12}{:>12}{:>14}'.format('dataset', 'linkage', 'matches', 'hac s', 'scipy s', 'max distance'))
+    for name, features in datasets():
+        for method in hw4.LINKAGES:
+            hac_time, Z = best_time(lambda: hw4.hac(features, linkage=method), runs=1)
+            scipy_time, expected = best_time(lambda: linkage(features, method))
+            matches = np.array_equal(Z[:, [0, 1, 3]], expected[:, [0, 1, 3]]) and np.allclose(Z[:, 2], expected[:, 2])
+            print('{:<14}{:>10}{:>10}{:>12.3f}{:>12.3f}{:>14.2e}'.format(name, method, str(matches), hac_time, scipy_time, np.abs(Z[:, 2] - expected[:, 2]).max()))
+
+# complete linkage by the pairwise scan of the original hac, ties go to the pair with the smallest cluster list positions
+# merged clusters are appended to the end of the list, so it is the reference for the tie-breaking of hac
+def pairwise_hac(features):
+    n = len(features)
+    distance_matrix = np.sqrt(np.sum((features[:, np.newaxis] - features[np.newaxis]) ** 2, axis=2))
+    clusters = [[i] for i in range(n)]
+    numbers = list(range(n))
+    Z = np.zeros((n - 1, 4))
+    for row in range(n - 1):
+        # strict < in row-major order keeps the first pair among ties
+        best, best_i, best_j = np.inf, 0, 0
+        for i in range(len(clusters)):
+            for j in range(i + 1, len(clusters)):
+                distance = distance_matrix[np.ix_(clusters[i], clusters[j])].max()
+                if distance < best:
+                    best, best_i, best_j = distance, i, j
+        Z[row] = [numbers[best_i], numbers[best_j], best, len(clusters[best_i]) + len(clusters[best_j])]
+        clusters.append(clusters[best_i] + clusters[best_j])
+        numbers.append(n + row)
+        for index in (best_j, best_i):
+            clusters.pop(index)
+            numbers.pop(index)
+    return Z
+
+# hac against the pairwise scan on distinct integer grid points, where many distances tie exactly
+def benchmark_ties(trials=40, n=30, grid=10):
+    rng = np.random.default_rng(0)
+    matches = 0
+    for _ in range(trials):
+        cells = rng.choice(grid * grid, n, replace=False)
+        features = np.column_stack([cells // grid, cells % grid]).astype(np.float64)
+        matches += np.array_equal(hw4.hac(features), pairwise_hac(features))
+    print('hac matches the pairwise scan on {} of {} sets of {} grid points'.format(matches, trials, n))
+
+# adjusted Rand index of two flat clusterings, 1 for identical partitions and about 0 for random ones
+def adjusted_rand_index(a, b):
+    _, a = np.unique(a, return_inverse=True)
+    _, b = np.unique(b, return_inverse=True)
+    table = np.zeros((a.max() + 1, b.max() + 1))
+    np.add.at(table, (a, b), 1)
+    pairs = lambda x: np.sum(x * (x - 1) / 2)
+    index, rows, columns, total = pairs(table), pairs(table.sum(axis=1)), pairs(table.sum(axis=0)), pairs(np.array([len(a)]))
+    expected = rows * columns / total
+    return (index - expected) / ((rows + columns) / 2 - expected)
+
+# runtime and peak traced memory of a function, with its result
+# tracemalloc slows allocations down, so the memory is measured on a second, separate run
+def measure(function):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+# gaussian blobs in the 6 feature dimensions
+def blobs(n, centers=20, random_state=0):
+    rng = np.random.default_rng(random_state)
+    locations = rng.normal(scale=6.0, size=(centers, 6))
+    return locations[rng.integers(0, centers, n)] + rng.normal(size=(n, 6))
+
+# approximate_hac against exact hac where exact is possible, then approximate only on large inputs
+def benchmark_approximate(exact_sizes=(2000, 5000), large_sizes=(100000,), micro_clusters=1000, cuts=(5, 20, 100)):
+    print('{:>8}{:>10}{:>10}{:>12}{:>10}  {}'.format('n', 'method', 'seconds', 'peak MB', 'monotone', 'ARI with exact at ' + ', '.join(str(c) for c in cuts) + ' clusters'))
+    for n in exact_sizes + large_sizes:
+        features = blobs(n)
+        approximate_time, approximate_peak, Z = measure(lambda: hw4.approximate_hac(features, micro_clusters))
+        monotone = bool(is_monotonic(Z))
+        if n in exact_sizes:
+            exact_time, exact_peak, exact = measure(lambda: hw4.hac(features))
+            agreement = ', '.join('{:.3f}'.format(adjusted_rand_index(fcluster(Z, c, 'maxclust'), fcluster(exact, c, 'maxclust'))) for c in cuts)
+            print('{:>8}{:>10}{:>10.2f}{:>12.1f}{:>10}'.format(n, 'exact', exact_time, exact_peak / (1 << 20), str(bool(is_monotonic(exact)))))
+        else:
+            agreement = 'exact not run'
+        print('{:>8}{:>10}{:>10.2f}{:>12.1f}{:>10}  {}'.format(n, 'approx', approximate_time, approximate_peak / (1 << 20), str(monotone), agreement))
+
+def main():
+    benchmarks = {'linkage': benchmark_linkage, 'ties': benchmark_ties, 'approximate': benchmark_approximate}
+    names = sys.argv[1:] or list(benchmarks)
+    for name in names:
+        benchmarks[name]()
+
+if __name__ == '__main__':
+    main()
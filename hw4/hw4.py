@@ -1,4 +1,6 @@
+import json
 import scipy
+import itertools
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -18,92 +20,443 @@ def calc_features(row):
     # construct a numpy array of the features for one data entry, reshape to (6,)
     return np.array([float(row['Population']), float(row['Net migration']), float(row['GDP ($ per capita)']), float(row['Literacy (%)']), float(row['Phones (per 1000)']), float(row['Infant mortality (per 1000 births)']) ], dtype = np.float64).reshape(6,)
 
+# the six feature columns of calc_features, in order
+FEATURE_COLUMNS = ['Population', 'Net migration', 'GDP ($ per capita)', 'Literacy (%)', 'Phones (per 1000)', 'Infant mortality (per 1000 births)']
+
+# empty fields are missing values
+def parse_field(field):
+    return float(field) if field.strip() else np.nan
+
+# parse the selected fields of a list of csv lines into a float64 array with numpy's C parser, empty fields become nan
+def parse_chunk(lines, indices):
+    try:
+        return np.loadtxt(lines, delimiter=',', usecols=indices, dtype=np.float64, ndmin=2)
+    except ValueError:
+        # the fast path cannot parse empty fields, so only chunks with missing values pay for a Python converter
+        return np.loadtxt(lines, delimiter=',', usecols=indices, dtype=np.float64, ndmin=2, converters=parse_field)
+
+# read a countries.csv style file straight into float64 arrays of the selected columns, chunk_rows rows at a time
+# missing is what to do with empty or nan fields: 'nan' keeps them, 'drop' drops their rows, or a number to fill them with
+def iter_feature_chunks(filepath, columns=FEATURE_COLUMNS, chunk_rows=1 << 16, missing='nan'):
+    with open(filepath, 'r') as f:
+        # read in the header, and find the position of every selected column
+        header = f.readline().strip().split(',')
+        indices = [header.index(column) for column in columns]
+        while True:
+            raw = list(itertools.islice(f, chunk_rows))
+            if not raw:
+                break
+            # a chunk of only blank lines is skipped, the end of the file is an empty read
+            lines = [line for line in raw if line.strip()]
+            if not lines:
+                continue
+            chunk = parse_chunk(lines, indices)
+            if missing == 'drop':
+                chunk = chunk[~np.isnan(chunk).any(axis=1)]
+            elif missing != 'nan':
+                chunk[np.isnan(chunk)] = missing
+            yield chunk
+
+# the N x len(columns) float64 feature array of a countries.csv style file, in one pass without per-row dictionaries
+# missing also accepts 'mean', which fills the missing fields with the mean of their column
+def load_features(filepath, columns=FEATURE_COLUMNS, chunk_rows=1 << 16, missing='nan'):
+    chunks = list(iter_feature_chunks(filepath, columns, chunk_rows, 'nan' if missing == 'mean' else missing))
+    features = np.concatenate(chunks) if chunks else np.zeros((0, len(columns)))
+    if missing == 'mean':
+        column_means = np.nanmean(features, axis=0)
+        rows, cols = np.nonzero(np.isnan(features))
+        features[rows, cols] = column_means[cols]
+    return features
+
+# compatibility shim for code written against load_data and calc_features: the same list of (6,) arrays
+def load_feature_rows(filepath, missing='nan'):
+    return list(load_features(filepath, missing=missing))
+
 # The input to this function will be a list of the feature vectors output from calc_features
 # It should return a list of numpy arrays, each of which is a 6x1 column vector corresponding to one data point
 def normalize_features(features):
-    # deep copy the features, or else the input features will be changed
-    features_copy = features.copy()
-
-    # columns mean
-    columns_mean = np.mean(features_copy, axis = 0)
-    # columns std
-    columns_std = np.std(features_copy, axis = 0)
-    
-    return [(array - columns_mean) / columns_std for array in features_copy]
-
-# complete-linkage hierarchical clustering
-def hac(features):
-    # construct a distance matrix
-    distance_matrix = np.zeros((len(features), len(features)), dtype = np.float64)
-    for i in range(len(features)):
-        for j in range(len(features)):
-            # calculate the Euclidean distance between two data points
-            distance_matrix[i][j] = np.sqrt(np.sum((features[i] - features[j]) ** 2))
-
-    # generate a list of lists, each list represents a cluster, the first element of the list is the cluster number including the merged clusters (n + row), the rest of the elements are the individual data points in the cluster
-    clusters_list = [[i, i] for i in range(len(features))]
+    # the column mean and std are fitted by a FeatureScaler, which can also be kept to normalize new rows
+    return FeatureScaler().fit(features).transform_rows(features)
+
+class FeatureScaler:
+    """ Column means and standard deviations fitted once and reused to normalize new rows.
+
+    Same normalization as normalize_features, but the statistics are kept: they can be
+    accumulated over streaming chunks, applied in place to new 2-D arrays, and saved so that
+    new countries are scored against an existing clustering without rereading the old data.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        # sum of squared deviations from the mean of every column
+        self.M2 = None
+
+    def partial_fit(self, chunk):
+        """ Adds the rows of a 2-D chunk to the statistics, merged with the pairwise update of Chan et al.
+        """
+        chunk = np.asarray(chunk, dtype=np.float64).reshape(len(chunk), -1)
+        if len(chunk) == 0:
+            return self
+        count = len(chunk)
+        mean = np.mean(chunk, axis=0)
+        M2 = np.sum((chunk - mean) ** 2, axis=0)
+        if self.count == 0:
+            self.count, self.mean, self.M2 = count, mean, M2
+        else:
+            total = self.count + count
+            delta = mean - self.mean
+            self.M2 = self.M2 + M2 + delta ** 2 * (self.count * count / total)
+            self.mean = self.mean + delta * (count / total)
+            self.count = total
+        return self
+
+    def fit(self, features):
+        """ Fits the statistics of a list of feature vectors or a 2-D array, replacing any previous fit.
+        """
+        self.__init__()
+        return self.partial_fit(features)
+
+    def fit_chunks(self, chunks):
+        """ Fits the statistics chunk by chunk, e.g. from iter_feature_chunks.
+        """
+        self.__init__()
+        for chunk in chunks:
+            self.partial_fit(chunk)
+        return self
+
+    @property
+    def std(self):
+        # population standard deviation, the same as np.std in normalize_features
+        return np.sqrt(self.M2 / self.count)
+
+    def transform(self, features, out=None):
+        """ Normalizes the rows of a 2-D array, in place when out is the array itself, without per-row allocation.
+        """
+        features = np.asarray(features, dtype=np.float64)
+        if out is None:
+            out = np.empty_like(features)
+        np.subtract(features, self.mean, out=out)
+        np.divide(out, self.std, out=out)
+        return out
+
+    def transform_rows(self, features):
+        """ The list of normalized (6,) arrays that normalize_features returns.
+        """
+        return list(self.transform(np.asarray(features, dtype=np.float64).reshape(len(features), -1)))
+
+    def save(self, filepath):
+        """ Writes the fitted statistics as JSON, floats are written with enough digits to round-trip exactly.
+        """
+        with open(filepath, 'w') as f:
+            json.dump({'count': self.count, 'mean': self.mean.tolist(), 'M2': self.M2.tolist()}, f)
+
+    @classmethod
+    def load(cls, filepath):
+        """ Reads statistics written by save.
+        """
+        with open(filepath, 'r') as f:
+            state = json.load(f)
+        scaler = cls()
+        scaler.count = state['count']
+        scaler.mean = np.array(state['mean'], dtype=np.float64)
+        scaler.M2 = np.array(state['M2'], dtype=np.float64)
+        return scaler
+
+# condensed distance matrix: the distances of every pair i < j stored row by row in one array of n(n - 1)/2 entries,
+# the layout of scipy.spatial.distance.pdist, pair (i, j) is at condensed_offsets(n)[i] + j
+def condensed_offsets(n):
+    i = np.arange(n, dtype=np.int64)
+    return n * i - i * (i + 1) // 2 - i - 1
+
+# positions in the condensed matrix of the distances between slot u and every slot, position u itself is a dummy 0
+def condensed_row_indices(offsets, u):
+    n = len(offsets)
+    indices = np.zeros(n, dtype=np.int64)
+    indices[:u] = offsets[:u] + u
+    indices[u + 1:] = offsets[u] + np.arange(u + 1, n)
+    return indices
+
+# Euclidean distances of every pair of rows as a condensed matrix, computed block by block with BLAS
+# uses ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a . b, clamped at 0 since rounding can make it slightly negative
+# the features are shifted by their rounded column means, which keeps the norms of raw features small and the cancellation
+# error low, while integer features stay integers, so their squared distances and ties are exact like the pairwise scan
+# the blocks are computed in float64 and stored as dtype, so float32 only rounds the final distances
+def condensed_distances(features, dtype=np.float64, block_rows=1024):
+    features = np.asarray(features, dtype=np.float64).reshape(len(features), -1)
+    n = len(features)
+    if n > 0:
+        features = features - np.round(np.mean(features, axis=0))
+    squared_norms = np.einsum('ij,ij->i', features, features)
+    offsets = condensed_offsets(n)
+    distances = np.empty(n * (n - 1) // 2, dtype=dtype)
+    for first in range(0, n, block_rows):
+        last = min(first + block_rows, n)
+        # squared distances from the rows of the block to every row from the first row of the block on
+        block = squared_norms[first:last, np.newaxis] + squared_norms[first:] - 2 * np.dot(features[first:last], features[first:].T)
+        np.maximum(block, 0, out=block)
+        np.sqrt(block, out=block)
+        for i in range(first, last):
+            distances[offsets[i] + i + 1:offsets[i] + n] = block[i - first, i - first + 1:]
+    return distances
+
+# nearest partner of the clusters in slots among the active clusters with a larger cluster number
+# ties are broken by the smaller cluster number, returns the distances and slots, (inf, -1) where there is no such cluster
+# the slots are handled block_rows at a time as one gathered block of the condensed matrix
+def nearest_partners(distances, offsets, cluster_numbers, active, slots, block_rows=256):
+    slots = np.asarray(slots, dtype=np.int64)
+    n = len(offsets)
+    columns = np.arange(n)
+    nearest_distance = np.full(len(slots), np.inf)
+    nearest_slot = np.full(len(slots), -1)
+    for first in range(0, len(slots), block_rows):
+        block = slots[first:first + block_rows, np.newaxis]
+        partners = active & (cluster_numbers > cluster_numbers[block])
+        # pair (i, j) with i < j is at offsets[i] + j, the diagonal is never a partner and reads a dummy 0
+        indices = np.where(block < columns, offsets[block] + columns, offsets[columns] + block)
+        indices[block == columns] = 0
+        rows = np.where(partners, distances[indices], np.inf)
+        min_distance = np.min(rows, axis=1)
+        # among the closest partners, the one with the smallest cluster number
+        tied_numbers = np.where(rows == min_distance[:, np.newaxis], cluster_numbers, np.iinfo(np.int64).max)
+        found = min_distance < np.inf
+        nearest_distance[first:first + block_rows] = min_distance
+        nearest_slot[first:first + block_rows] = np.where(found, np.argmin(tied_numbers, axis=1), -1)
+    return nearest_distance, nearest_slot
+
+# Lance-Williams update rules: the distance from cluster k to the merge of clusters i and j, from d(k, i), d(k, j),
+# d(i, j) and the cluster sizes, every argument but d(i, j) and n_i, n_j is an array over k
+def complete_update(d_ki, d_kj, d_ij, n_i, n_j, n_k):
+    return np.maximum(d_ki, d_kj)
+
+def average_update(d_ki, d_kj, d_ij, n_i, n_j, n_k):
+    return (n_i * d_ki + n_j * d_kj) / (n_i + n_j)
+
+# Ward's rule on Euclidean distances, the same as scipy: the update is on squared distances
+def ward_update(d_ki, d_kj, d_ij, n_i, n_j, n_k):
+    return np.sqrt(((n_i + n_k) * d_ki ** 2 + (n_j + n_k) * d_kj ** 2 - n_k * d_ij ** 2) / (n_i + n_j + n_k))
+
+LINKAGE_UPDATES = {'complete': complete_update, 'average': average_update, 'ward': ward_update}
+# single linkage has its own minimum spanning tree path, see single_linkage
+LINKAGES = ('single',) + tuple(LINKAGE_UPDATES)
+
+# single-linkage clustering of n points from their condensed distance matrix
+# the Lance-Williams rule min(d(k, i), d(k, j)) leaves the nearest partners of most clusters stale after a merge,
+# so instead the minimum spanning tree is built with Prim's algorithm in O(n^2) and its edges are merged in increasing
+# order, which gives the same dendrogram; merges at exactly equal distances may come in a different order
+def single_linkage(distances, n):
+    offsets = condensed_offsets(n)
+    in_tree = np.zeros(n, dtype=bool)
+    # distance from every point to the tree, and the tree point it is closest to
+    tree_distance = np.full(n, np.inf)
+    tree_parent = np.zeros(n, dtype=np.int64)
+    edges = np.zeros((n - 1, 3))
+    current = 0
+    for i in range(n - 1):
+        in_tree[current] = True
+        row = distances[condensed_row_indices(offsets, current)]
+        closer = ~in_tree & (row < tree_distance)
+        tree_distance[closer] = row[closer]
+        tree_parent[closer] = current
+        current = np.argmin(np.where(in_tree, np.inf, tree_distance))
+        edges[i] = tree_parent[current], current, tree_distance[current]
+    edges = edges[np.argsort(edges[:, 2], kind='stable')]
+
+    # merge along the edges with a union-find over the points, each root remembers its cluster number and size
+    root = np.arange(n)
+    cluster_numbers = np.arange(n)
+    cluster_sizes = np.ones(n, dtype=np.int64)
+    def find(x):
+        while root[x] != x:
+            root[x] = root[root[x]]
+            x = root[x]
+        return x
+    clustering = np.zeros((n - 1, 4))
+    for row_index in range(n - 1):
+        a, b = find(int(edges[row_index, 0])), find(int(edges[row_index, 1]))
+        clustering[row_index] = min(cluster_numbers[a], cluster_numbers[b]), max(cluster_numbers[a], cluster_numbers[b]), edges[row_index, 2], cluster_sizes[a] + cluster_sizes[b]
+        root[b] = a
+        cluster_numbers[a] = n + row_index
+        cluster_sizes[a] += cluster_sizes[b]
+    return clustering
+
+# hierarchical clustering of n points from their condensed distance matrix, which is overwritten
+# linkage is one of LINKAGES, the output is the (n − 1) × 4 linkage matrix of scipy.cluster.hierarchy.linkage
+# every pair of clusters is keyed by (distance, smaller cluster number, larger cluster number), so merges follow the same
+# tie-breaking as the original pairwise scan: closest pair, then the smallest first cluster number, then the smallest second one
+# each cluster keeps its nearest partner among the clusters with a larger number, which turns a merge into O(n) updates
+# of the Lance-Williams rule and O(n^2) work in total for typical data
+def linkage_clustering(distances, n, linkage='complete'):
+    if linkage not in LINKAGES:
+        raise ValueError('unknown linkage {}, expected one of {}'.format(linkage, ', '.join(LINKAGES)))
+    if n < 2:
+        return np.zeros((0, 4))
+    if linkage == 'single':
+        return single_linkage(distances, n)
+    update = LINKAGE_UPDATES[linkage]
+    offsets = condensed_offsets(n)
+    # each slot holds one cluster, the merged cluster reuses the slot of its first cluster
+    cluster_numbers = np.arange(n)
+    cluster_sizes = np.ones(n, dtype=np.int64)
+    active = np.ones(n, dtype=bool)
+    # nearest partner of each slot, see nearest_partners
+    nearest_distance = np.full(n, np.inf)
+    nearest_slot = np.full(n, -1)
+    nearest_distance[:], nearest_slot[:] = nearest_partners(distances, offsets, cluster_numbers, active, np.arange(n))
 
     # construct (n − 1) × 4 array
-    clustering = np.zeros((len(features) - 1, 4))
-
-    for row_index in range(len(features) - 1):
-        # determine which two clusters are the closest, put their numbers into the first and second elements of the row
-
-        # found minimum distance between two clusters
-        min_distance = 0
-        # smaller index of the two clusters with minimum distance
-        merge_cluster_index_min = 0
-        # larger index of the two clusters with minimum distance
-        merge_cluster_index_max = 0
-
-        # calculate the complete-linkage distance between two clusters
-        for i in range(len(clusters_list)):
-            for j in range(i + 1, len(clusters_list)):
-                # define maximum distance between any two points each within the two clusters
-                max_distance = 0
-
-                # calculate the maximum distance between any two points
-                for value1 in clusters_list[i][1:]:
-                    for value2 in clusters_list[j][1:]:
-                        if distance_matrix[value1][value2] > max_distance or max_distance == 0:
-                            max_distance = distance_matrix[value1][value2]
-                
-                # update the merged clusters index
-                if min_distance == 0 or max_distance < min_distance:
-                    min_distance = max_distance
-                    merge_cluster_index_min = min(i, j)
-                    merge_cluster_index_max = max(i, j)
-                # tie-breaking when two pairs of clusters have the same distance, pick the pair with the smallest first index, if tie again, pick the pair with the smallest second index
-                elif max_distance == min_distance:
-                    if min(i, j) < merge_cluster_index_min:
-                        merge_cluster_index_min = min(i, j)
-                        merge_cluster_index_max = max(i, j)
-                    elif min(i, j) == merge_cluster_index_min:
-                        if max(i, j) < merge_cluster_index_max:
-                            merge_cluster_index_min = min(i, j)
-                            merge_cluster_index_max = max(i, j)
+    clustering = np.zeros((n - 1, 4))
+
+    for row_index in range(n - 1):
+        # closest pair, the slot with the smallest cluster number wins ties
+        min_distance = np.min(nearest_distance)
+        candidates = np.flatnonzero(nearest_distance == min_distance)
+        u = candidates[np.argmin(cluster_numbers[candidates])]
+        v = nearest_slot[u]
 
         # update clustering matrix
-        clustering[row_index][0] = clusters_list[merge_cluster_index_min][0]
-        clustering[row_index][1] = clusters_list[merge_cluster_index_max][0]
+        clustering[row_index][0] = cluster_numbers[u]
+        clustering[row_index][1] = cluster_numbers[v]
         clustering[row_index][2] = min_distance
-        clustering[row_index][3] = len(clusters_list[merge_cluster_index_min]) + len(clusters_list[merge_cluster_index_max]) - 2
-
-        # merge the two clusters in the clusters_list
-        # pop the first element of each cluster
-        clusters_list[merge_cluster_index_min].pop(0)
-        clusters_list[merge_cluster_index_max].pop(0)
-        # append the second cluster to the first cluster
-        new_list = clusters_list[merge_cluster_index_min] + clusters_list[merge_cluster_index_max]
-        new_list.insert(0, len(features) + row_index)
-        # insert the new index number as the first element of the new cluster
-        clusters_list.append(new_list)
-        # pop the two old clusters, had to pop the larger index first, or else the smaller index will change
-        clusters_list.pop(merge_cluster_index_max)
-        clusters_list.pop(merge_cluster_index_min)
-        
+        clustering[row_index][3] = cluster_sizes[u] + cluster_sizes[v]
+
+        # merge v into the slot of u with the Lance-Williams rule
+        # the entries of inactive slots are never read again, so only the row of u is written back
+        row_u = condensed_row_indices(offsets, u)
+        with np.errstate(invalid='ignore'):
+            merged_row = update(distances[row_u], distances[condensed_row_indices(offsets, v)], min_distance, cluster_sizes[u], cluster_sizes[v], cluster_sizes).astype(distances.dtype)
+        active[v] = False
+        active[u] = False
+        distances[row_u[active]] = merged_row[active]
+        merged_row = np.where(active, merged_row, np.inf)
+        active[u] = True
+        nearest_distance[v], nearest_slot[v] = np.inf, -1
+        cluster_numbers[u] = n + row_index
+        cluster_sizes[u] += cluster_sizes[v]
+
+        # the new cluster has the largest number, so it has no partner of its own but is a partner of every other cluster
+        nearest_distance[u], nearest_slot[u] = np.inf, -1
+        closer = merged_row < nearest_distance
+        nearest_distance[closer] = merged_row[closer]
+        nearest_slot[closer] = u
+        # clusters whose partner was merged look for a new one
+        stale = np.flatnonzero(active & ((nearest_slot == v) | ((nearest_slot == u) & ~closer)))
+        if len(stale):
+            nearest_distance[stale], nearest_slot[stale] = nearest_partners(distances, offsets, cluster_numbers, active, stale)
+
     return clustering
 
+# complete-linkage hierarchical clustering, or single, average or ward with the linkage argument
+# dtype=np.float32 halves the memory of the condensed distance matrix, n(n - 1)/2 entries
+def hac(features, dtype=np.float64, linkage='complete'):
+    return linkage_clustering(condensed_distances(features, dtype), len(features), linkage)
+
+# index of the nearest center of every row, computed block by block with BLAS, and the distance to it
+def nearest_centers(features, centers, block_rows=1 << 14):
+    labels = np.empty(len(features), dtype=np.int64)
+    distances = np.empty(len(features))
+    center_norms = np.einsum('ij,ij->i', centers, centers)
+    for first in range(0, len(features), block_rows):
+        block = features[first:first + block_rows]
+        squared = np.einsum('ij,ij->i', block, block)[:, np.newaxis] + center_norms - 2 * np.dot(block, centers.T)
+        labels[first:first + block_rows] = np.argmin(squared, axis=1)
+        distances[first:first + block_rows] = np.sqrt(np.maximum(squared[np.arange(len(block)), labels[first:first + block_rows]], 0))
+    return labels, distances
+
+# mini-batch k-means of Sculley (2010): every center moves towards the mean of its batch members with a step of
+# 1 / (number of points it has absorbed so far), returns the k centers
+def minibatch_kmeans(features, k, batch_size=1024, iterations=100, random_state=0):
+    rng = np.random.default_rng(random_state)
+    centers = features[rng.choice(len(features), k, replace=False)].copy()
+    absorbed = np.zeros(k)
+    for _ in range(iterations):
+        batch = features[rng.integers(0, len(features), batch_size)]
+        labels, _ = nearest_centers(batch, centers)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, batch)
+        moved = counts > 0
+        absorbed[moved] += counts[moved]
+        centers[moved] += (sums[moved] - counts[moved, np.newaxis] * centers[moved]) / absorbed[moved, np.newaxis]
+    return centers
+
+# reorder the rows of a linkage matrix by increasing distance and renumber the merged clusters to match
+# a merge is never below the merges it contains, so a stable sort keeps every cluster after the rows that built it
+def sort_linkage(Z, n):
+    order = np.argsort(Z[:, 2], kind='stable')
+    new_numbers = np.arange(2 * n - 1)
+    new_numbers[n + order] = n + np.arange(len(order))
+    Z = Z[order]
+    Z[:, :2] = np.sort(new_numbers[Z[:, :2].astype(np.int64)], axis=1)
+    return Z
+
+# approximate complete-linkage clustering for inputs whose n(n - 1)/2 distances do not fit in memory
+# the points are summarized into micro_clusters mini-batch k-means clusters, each with its center, radius and members.
+# members of a micro-cluster are merged first, with exact complete linkage up to exact_limit members and in a chain at
+# twice the radius above it. Exact complete linkage then runs on the micro-clusters, with the distance between two of
+# them bounded by d(centers) + both radii, and at least their own heights, so the dendrogram stays monotone.
+# returns the (n − 1) × 4 linkage matrix over the original points, sorted by distance like hac
+def approximate_hac(features, micro_clusters=2000, exact_limit=256, batch_size=1024, iterations=100, random_state=0):
+    features = np.asarray(features, dtype=np.float64).reshape(len(features), -1)
+    n = len(features)
+    if n <= micro_clusters:
+        return hac(features)
+    centers = minibatch_kmeans(features, micro_clusters, batch_size, iterations, random_state)
+    labels, center_distances = nearest_centers(features, centers)
+    # drop the centers that no point ended up closest to
+    used = np.unique(labels)
+    centers = centers[used]
+    labels = np.searchsorted(used, labels)
+    k = len(centers)
+    radii = np.zeros(k)
+    np.maximum.at(radii, labels, center_distances)
+    members = np.split(np.argsort(labels, kind='stable'), np.cumsum(np.bincount(labels, minlength=k))[:-1])
+
+    rows = []
+    # cluster number and top merge height of every micro-cluster once its members are merged
+    roots = np.zeros(k, dtype=np.int64)
+    heights = np.zeros(k)
+    next_number = n
+    for a in range(k):
+        points = members[a]
+        if len(points) == 1:
+            roots[a] = points[0]
+            continue
+        if len(points) <= exact_limit:
+            local = hac(features[points])
+        else:
+            local = np.zeros((len(points) - 1, 4))
+            local[:, 0] = np.concatenate(([0], len(points) + np.arange(len(points) - 2)))
+            local[:, 1] = np.arange(1, len(points))
+            local[:, 2] = 2 * radii[a]
+            local[:, 3] = np.arange(2, len(points) + 1)
+        # local leaf i is the point points[i], local cluster m + r is the global cluster next_number + r
+        numbers = np.concatenate((points, next_number + np.arange(len(points) - 1)))
+        local[:, :2] = numbers[local[:, :2].astype(np.int64)]
+        rows.append(local)
+        roots[a] = next_number + len(points) - 2
+        heights[a] = local[-1, 2]
+        next_number += len(points) - 1
+
+    # complete linkage on the micro-clusters, starting from an upper bound of the distance of their farthest points
+    offsets = condensed_offsets(k)
+    distances = condensed_distances(centers)
+    for i in range(k - 1):
+        segment = slice(offsets[i] + i + 1, offsets[i] + k)
+        distances[segment] = np.maximum(distances[segment] + radii[i] + radii[i + 1:], np.maximum(heights[i], heights[i + 1:]))
+    top = linkage_clustering(distances, k, 'complete')
+    # micro-cluster i is the cluster roots[i], top-level cluster k + r is the global cluster next_number + r
+    numbers = np.concatenate((roots, next_number + np.arange(k - 1)))
+    top[:, :2] = numbers[top[:, :2].astype(np.int64)]
+    # the sizes of the top level count micro-clusters, convert them to numbers of points
+    sizes = np.concatenate((np.ones(n), np.zeros(n - 1)))
+    Z = np.concatenate(rows + [top])
+    for row_index in range(len(Z)):
+        Z[row_index, 3] = sizes[int(Z[row_index, 0])] + sizes[int(Z[row_index, 1])]
+        sizes[n + row_index] = Z[row_index, 3]
+    Z[:, :2] = np.sort(Z[:, :2], axis=1)
+
+    return sort_linkage(Z, n)
+
 def fig_hac(Z, names):
     # plot the dendrogram
     fig = plt.figure()